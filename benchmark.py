@@ -0,0 +1,329 @@
+# Headless benchmarks of the events pipeline, run without a display and without importing Kivy
+# Synthetic events and credentials files are generated in a temporary directory, and every stage is timed on them :
+#     python benchmark.py --sizes 1000 10000 100000 1000000 --output results.json
+#     python benchmark.py --sizes 1000 10000 --compare results.json
+#
+# The stages match what the application does :
+#     load          - reading the events file and building the indexes (on the I/O thread at start, without a snapshot)
+#     memory        - the memory held by the loaded events store, and the peak memory used while loading it
+#     snapshot_load - reading the events from their binary snapshot and building the indexes (file backend only)
+#     events_at     - the events at one venue, unsorted
+#     timeline_at   - the events at one venue, sorted by their timing (opening a location popup)
+#     upcoming_at   - the events at one venue starting from now, sorted by their timing
+#     clashes_at    - the events overlapping a new event (submitting the new event form)
+#     search_index  - building the search index (in the background, on the first search)
+#     search        - searching the events by prefixes of their words (typing in the search box)
+#     add_remove    - adding and removing an event, with their writes to the storage
+#     prune         - removing the events that have already ended (update_events_file)
+#     credentials   - reading the credentials file, then looking up usernames (signing in)
+
+import argparse
+import gc
+import hashlib
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+
+from event_store import EventStore, build_search_index, current_minutes, initial_datetime
+from storage import CredentialCache, FileStorage, SqliteStorage
+
+# Format of the results : {"format": 1, "machine": {...}, "parameters": {...},
+#                          "results": {<number of events>: {<stage>: {"runs": <repeats>, "best": <seconds>,
+#                                                                     "median": <seconds>, "operations": <count>}}}}
+# Timings are per run of the stage, and a run of a stage with several operations covers all of them
+# The memory stage has {"bytes": <bytes held>, "peak_bytes": <bytes>, "bytes_per_100k_events": <bytes>} instead
+results_format = 1
+
+default_sizes = [1000, 10000, 100000, 1000000]
+lookups = 1000  # Venues, clash checks and usernames looked up per run of a stage
+changes = 100  # Events added and removed per run of add_remove
+
+# A stage is reported as a regression by --compare when it is this much slower than in the baseline
+regression_ratio = 1.25
+
+
+# Returns the weights of the venues, for a Zipf-like distribution where a skew of 0 spreads events evenly
+def venue_weights(venues, skew):
+    return [1 / (rank + 1) ** skew for rank in range(venues)]
+
+
+# Writes synthetic events and credentials files, with a fifth of the events in the past
+def generate_files(directory, events, venues, skew, users, seed):
+    generator = random.Random(seed)
+    venue_names = ["Venue " + str(venue) for venue in range(venues)]
+    weights = venue_weights(venues, skew)
+    usernames = ["user" + str(user) for user in range(users)]
+
+    now = current_minutes()
+    first_minute = now - 30 * 24 * 60
+    last_minute = now + 120 * 24 * 60
+
+    events_path = os.path.join(directory, "events.txt")
+    credentials_path = os.path.join(directory, "credentials.txt")
+
+    with open(events_path, "w") as events_file:
+        chosen_venues = generator.choices(venue_names, weights, k=events)
+
+        for event in range(events):
+            timing = initial_datetime + timedelta(minutes=generator.randrange(first_minute, last_minute))
+            fields = [chosen_venues[event], generator.choice(usernames), timing.strftime("%d/%m/%Y %H:%M"),
+                      "Synthetic event number " + str(event) + ".\\nBring a friend!"]
+
+            if generator.random() < 0.5:
+                fields.append(str(generator.choice((30, 60, 90, 120, 180))))
+
+            events_file.write("Event " + str(event) + "||" + "|".join(fields) + "\n")
+
+    with open(credentials_path, "w") as credentials_file:
+        for username in usernames:
+            credentials_file.write(username + ":" + hashlib.sha512(username.encode()).hexdigest() + "\n")
+
+    return events_path, credentials_path, venue_names, usernames
+
+
+# Runs stage `repeats` times, calling setup untimed before every run, and returns the timing summary
+def time_stage(stage, repeats, operations=1, setup=None):
+    timings = []
+
+    for _ in range(repeats):
+        argument = setup() if setup else None
+
+        start = time.perf_counter()
+        if setup:
+            stage(argument)
+        else:
+            stage()
+        timings.append(time.perf_counter() - start)
+
+    return {"runs": repeats, "best": min(timings), "median": statistics.median(timings), "operations": operations}
+
+
+# Returns the memory held by what build returns, and the peak memory used while building it, as traced by tracemalloc
+# Tracing slows allocations down, so memory is measured apart from the timed stages
+def measure_memory(build, events):
+    gc.collect()
+    tracemalloc.start()
+
+    try:
+        built = build()
+        held, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    del built
+    return {"bytes": held, "peak_bytes": peak, "bytes_per_100k_events": round(held * 100000 / max(events, 1))}
+
+
+# Waits for the background maintenance of the storage (compaction and snapshots) to finish, so that it doesn't run
+# during a timed stage
+def settle(storage):
+    while getattr(storage, "compacting", False) or getattr(storage, "snapshotting", False):
+        time.sleep(0.01)
+
+
+# Returns a fresh storage backend for the files in directory
+def open_backend(backend, directory, events_path, credentials_path):
+    file_storage = FileStorage(events_path, credentials_path)
+
+    if backend == "file":
+        return file_storage
+
+    database_path = os.path.join(directory, "events.db")
+    if os.path.exists(database_path):
+        return SqliteStorage(database_path)
+
+    sqlite_storage = SqliteStorage(database_path)
+    sqlite_storage.write_events(file_storage.read_events())
+    for username, password_hash in file_storage.read_credentials().items():
+        sqlite_storage.write_credential(username, password_hash)
+
+    return sqlite_storage
+
+
+# Times every stage on `events` synthetic events, and returns {<stage>: <timing summary>}
+def benchmark_size(events, arguments):
+    directory = tempfile.mkdtemp(prefix="event_mapper_benchmark_")
+
+    try:
+        events_path, credentials_path, venue_names, usernames = generate_files(
+            directory, events, arguments.venues, arguments.skew, arguments.users, arguments.seed)
+
+        # Pristine copies, restored before the stages that change the files
+        shutil.copy(events_path, events_path + ".original")
+        shutil.copy(credentials_path, credentials_path + ".original")
+
+        backends = []
+
+        def restore():
+            for backend in backends:
+                settle(backend)
+                backend.close()
+            backends.clear()
+
+            shutil.copy(events_path + ".original", events_path)
+            for derived_path in (os.path.join(directory, "events.db"), events_path + ".snapshot"):
+                if os.path.exists(derived_path):
+                    os.remove(derived_path)
+
+            backends.append(open_backend(arguments.backend, directory, events_path, credentials_path))
+            return backends[0]
+
+        generator = random.Random(arguments.seed)
+        lookup_venues = generator.choices(venue_names, venue_weights(arguments.venues, arguments.skew), k=lookups)
+        lookup_usernames = [generator.choice(usernames) for _ in range(lookups)]
+        now = current_minutes()
+        lookup_minutes = [now + generator.randrange(0, 120 * 24 * 60) for _ in range(lookups)]
+        lookup_queries = ["event " + str(generator.randrange(events))[:3] for _ in range(lookups)]
+
+        results = {}
+
+        storage = restore()
+
+        # Loading a store writes the snapshot of the events file in the background, which is removed before every run
+        def without_snapshot():
+            settle(storage)
+            if os.path.exists(events_path + ".snapshot"):
+                os.remove(events_path + ".snapshot")
+
+        results["load"] = time_stage(lambda _: EventStore(storage), arguments.repeats, setup=without_snapshot)
+        without_snapshot()
+        results["memory"] = measure_memory(lambda: EventStore(storage), events)
+        settle(storage)
+
+        if arguments.backend == "file":
+            storage.take_snapshot()
+            results["snapshot_load"] = time_stage(lambda: EventStore(storage), arguments.repeats)
+
+        event_store = EventStore(storage)
+
+        results["events_at"] = time_stage(
+            lambda: [event_store.events_at(venue) for venue in lookup_venues], arguments.repeats, lookups)
+        results["timeline_at"] = time_stage(
+            lambda: [event_store.timeline_at(venue) for venue in lookup_venues], arguments.repeats, lookups)
+        results["upcoming_at"] = time_stage(
+            lambda: [event_store.upcoming_at(venue) for venue in lookup_venues], arguments.repeats, lookups)
+        results["clashes_at"] = time_stage(
+            lambda: [event_store.clashes_at(venue, minute, 60) for venue, minute in zip(lookup_venues, lookup_minutes)],
+            arguments.repeats, lookups)
+
+        results["search_index"] = time_stage(lambda: build_search_index(event_store.events), arguments.repeats)
+        event_store.search("")
+        results["search"] = time_stage(
+            lambda: [event_store.search(query) for query in lookup_queries], arguments.repeats, lookups)
+
+        def add_remove():
+            for change in range(changes):
+                event_store.add_event("Benchmark event " + str(change),
+                                      [lookup_venues[change], lookup_usernames[change], "01/01/2100 10:00",
+                                       "Added by the benchmark", "60"])
+
+            for change in range(changes):
+                event_store.remove_event("Benchmark event " + str(change))
+
+        results["add_remove"] = time_stage(add_remove, arguments.repeats, 2 * changes)
+
+        # Every run prunes a freshly loaded store, as the application does on start
+        def load_for_prune():
+            store = EventStore(restore())
+            settle(store.storage)
+            return store
+
+        results["prune"] = time_stage(lambda store: store.prune(), arguments.repeats, setup=load_for_prune)
+
+        def credential_lookups():
+            credentials = CredentialCache(restore())
+            for username in lookup_usernames:
+                credentials.get(username)
+
+        results["credentials"] = time_stage(credential_lookups, arguments.repeats, lookups)
+
+        restore()
+        return results
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+# Prints the stages that got slower than in the baseline results, and returns whether there were any
+def compare(results, baseline):
+    regressions = False
+
+    for size, stages in results["results"].items():
+        baseline_stages = baseline["results"].get(size, {})
+
+        for stage, summary in stages.items():
+            if stage not in baseline_stages:
+                continue
+
+            # Timed stages are compared by their best run, and the memory stage by the memory held
+            if "bytes" in summary:
+                value, shown = summary["bytes"], "{:>10.1f}MB".format(summary["bytes"] / 1e6)
+            else:
+                value, shown = summary["best"], "{:>10.6f}s ".format(summary["best"])
+
+            ratio = value / baseline_stages[stage]["bytes" if "bytes" in summary else "best"]
+            marker = ""
+
+            if ratio > regression_ratio:
+                marker = "  <- regression"
+                regressions = True
+
+            print("{:>8} events  {:<13} {}  {:>6.2f}x{}".format(size, stage, shown, ratio, marker), file=sys.stderr)
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless benchmarks of the events pipeline")
+    parser.add_argument("--sizes", type=int, nargs="+", default=default_sizes, help="numbers of events to generate")
+    parser.add_argument("--venues", type=int, default=20, help="number of venues")
+    parser.add_argument("--skew", type=float, default=1.0,
+                        help="how much events are concentrated in the first venues (0 spreads them evenly)")
+    parser.add_argument("--users", type=int, default=500, help="number of organisers in the credentials file")
+    parser.add_argument("--backend", choices=("file", "sqlite"), default="file")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="file to write the results to, instead of the standard output")
+    parser.add_argument("--compare", help="results of an earlier run, to report the stages that got slower")
+    arguments = parser.parse_args(argv)
+
+    results = {
+        "format": results_format,
+        "machine": {"python": platform.python_version(), "implementation": platform.python_implementation(),
+                    "system": platform.platform(), "processor": platform.processor() or platform.machine(),
+                    "cpus": os.cpu_count()},
+        "parameters": {"venues": arguments.venues, "skew": arguments.skew, "users": arguments.users,
+                       "backend": arguments.backend, "repeats": arguments.repeats, "seed": arguments.seed,
+                       "lookups": lookups, "changes": changes},
+        "results": {}
+    }
+
+    for size in arguments.sizes:
+        print("Benchmarking " + str(size) + " events", file=sys.stderr)
+        results["results"][str(size)] = benchmark_size(size, arguments)
+
+    if arguments.output:
+        with open(arguments.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if arguments.compare:
+        with open(arguments.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+
+        if compare(results, baseline):
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
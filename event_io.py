@@ -0,0 +1,316 @@
+# Validation of new events, shared by the new event form and bulk imports, and bulk import and export of events as CSV
+# or JSON Lines, for schedules with thousands of events
+# It doesn't import Kivy, so it runs from the command line :
+#     python event_io.py import schedule.csv --organiser alice
+#     python event_io.py export events.jsonl --venue Library
+# The format is chosen by the file's extension (.csv, or .jsonl for JSON Lines), and "-" reads or writes CSV on the
+# standard input or output
+# Format of an event, a CSV row under a header naming the fields, or a JSON object per line :
+#     {"name": <event name>, "venue": <location name>, "organiser": <username>, "date": <DD/MM/YYYY>,
+#      "time": <hh:mm>, "duration": <hh:mm, or empty>, "description": <text, which may span lines>}
+# The organiser can be left out of the file and given with --organiser instead
+# Venues must be landmarks of the map (see landmarks.json), the only places the form adds events to, unless
+# --any-venue is given
+#
+# An import reads the file as a stream and validates every event like the new event form does, then checks the
+# events for clashes with a single pass over them sorted by venue and timing
+# Nothing is written unless every event is valid, and all the events are then written with a single write
+# Clashing events are refused too, unless --allow-clashes is given, like the form lets organisers ignore a clash
+
+import argparse
+import contextlib
+import csv
+import json
+import re
+import sys
+from datetime import datetime
+
+from event_store import EventRecord, EventStore, datetime_to_minutes
+from landmarks import load_landmarks
+from storage import open_storage
+
+fields = ["name", "venue", "organiser", "date", "time", "duration", "description"]
+
+# Limits of the new event form, see NewEventDialog
+max_name_length = 30
+max_description_words = 100
+
+# Number of problems listed by the command line before the rest are only counted
+shown_problems = 20
+
+date_pattern = re.compile(r"\d\d/\d\d/\d\d\d\d")
+time_pattern = re.compile(r"\d\d:\d\d")
+
+
+# A new event that can't be added, with the message shown to the organiser
+class InvalidEvent(Exception):
+    pass
+
+
+# Returns if `year` is a leap year or not
+def is_leap(year):
+    return year % 400 == 0 or (year % 4 == 0 and year % 100 != 0)
+
+
+# Checks the fields of a new event, as typed into the new event form, and returns its record
+# The date is DD/MM/YYYY, the time and the optional duration hh:mm, and the description has real line breaks
+# Raises InvalidEvent if the event can't be added, which doesn't check whether its name is taken or it clashes
+def validate_event(name, venue, organiser, date, time, duration, description, now=None):
+    if not (name and date and time and description):  # IF one of the fields is empty
+        raise InvalidEvent("Please fill all entries")
+
+    # Event fields are separated by pipes in the events file, and event names by line breaks
+    if "|" in name or "\n" in name or "|" in venue or "|" in organiser or "|" in description:
+        raise InvalidEvent("Entries can't contain a pipe")
+
+    if len(name) > max_name_length:
+        raise InvalidEvent("Event name is too long")
+
+    if len(description.split()) > max_description_words:
+        raise InvalidEvent("Description is too long")
+
+    if not date_pattern.fullmatch(date):  # Invalid date format
+        raise InvalidEvent("Invalid date")
+
+    get_date, get_month, get_year = int(date[:2]), int(date[3:5]), int(date[6:])
+
+    days_in_month = [31, 28 + is_leap(get_year), 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
+
+    if not 1 <= get_month <= 12 or not 1 <= get_date <= days_in_month[get_month - 1]:  # Invalid date parameters
+        raise InvalidEvent("Invalid date")
+
+    if not time_pattern.fullmatch(time):  # Invalid time format
+        raise InvalidEvent("Invalid time")
+
+    get_hours, get_minutes = int(time[:2]), int(time[3:])
+
+    if get_hours >= 24 or get_minutes >= 60:  # Invalid time parameters
+        raise InvalidEvent("Invalid time")
+
+    if duration and (not time_pattern.fullmatch(duration) or int(duration[3:]) >= 60):  # Invalid duration
+        raise InvalidEvent("Invalid duration")
+
+    # Converting the new event's timing to a datetime object
+    event_datetime = datetime(get_year, get_month, get_date, get_hours, get_minutes)
+
+    if now is None:
+        now = datetime.now().replace(second=0, microsecond=0)
+
+    if event_datetime < now:  # If the new event's timing is before the current time
+        raise InvalidEvent("Event timing must be after\ncurrent timing")
+
+    new_event_duration = 0
+    if duration:
+        new_event_duration = int(duration[:2]) * 60 + int(duration[3:])
+
+    return EventRecord(venue, organiser, datetime_to_minutes(event_datetime), "\\n".join(description.split("\n")),
+                       new_event_duration)
+
+
+# Returns the fields of an event record, as read by validate_event
+def event_fields(event_name, event_data):
+    event_date, event_time = event_data.timing.split()
+    duration = ""
+    if event_data.duration:
+        duration = "%02d:%02d" % divmod(event_data.duration, 60)
+
+    return {"name": event_name, "venue": event_data.venue, "organiser": event_data.organiser, "date": event_date,
+            "time": event_time, "duration": duration, "description": "\n".join(event_data.description.split("\\n"))}
+
+
+# Yields the line number and fields of every event in an open CSV or JSON Lines file, one at a time
+def read_rows(events_file, file_format):
+    if file_format == "csv":
+        reader = csv.DictReader(events_file)
+
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_number, line in enumerate(events_file, 1):
+            if line.strip():
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    row = None
+
+                yield line_number, row if isinstance(row, dict) else None
+
+
+# Writes the fields of events, given as (<event name>, <EventRecord>) pairs, to an open CSV or JSON Lines file, one at
+# a time
+def write_rows(events_file, file_format, events):
+    if file_format == "csv":
+        writer = csv.DictWriter(events_file, fields)
+        writer.writeheader()
+
+        for event_name, event_data in events:
+            writer.writerow(event_fields(event_name, event_data))
+    else:
+        for event_name, event_data in events:
+            events_file.write(json.dumps(event_fields(event_name, event_data), ensure_ascii=False) + "\n")
+
+
+# Returns the format of the file at path, from its extension
+def file_format(path):
+    return "jsonl" if path.lower().endswith((".jsonl", ".ndjson")) else "csv"
+
+
+# Returns a dictionary of the events of batch, {<event name>: <EventRecord>}, that clash with an event added before
+# them, either in event_store or in batch, with the name of an event each one clashes with
+# Events clash when they are at the same venue and overlap, counting an event without a duration as taking up one
+# minute, like EventStore.clashes_at
+# The batch is sorted by venue and timing once, and gone through in a single pass, keeping the event that ends last so
+# far at the venue : an event starting before it ends overlaps it
+def find_clashes(event_store, batch):
+    clashes = {}
+    venue = None
+    last_end = last_name = None
+
+    for event_name in sorted(batch, key=lambda name: (batch[name].venue, batch[name].start)):
+        event_data = batch[event_name]
+
+        if event_data.venue != venue:
+            venue, last_end, last_name = event_data.venue, None, None
+
+        if last_end is not None and event_data.start < last_end:
+            clashes[event_name] = last_name
+        else:
+            # The stored events are kept in an interval index, so only those overlapping the event are visited
+            stored = event_store.clashes_at(venue, event_data.start, event_data.length)
+            if stored:
+                clashes[event_name] = next(iter(stored))
+
+        if last_end is None or event_data.start + event_data.length > last_end:
+            last_end, last_name = event_data.start + event_data.length, event_name
+
+    return clashes
+
+
+# Reads new events from an open CSV or JSON Lines file, and adds them to event_store with a single write if none of
+# them has a problem
+# organiser is used for the events without one, and organisers must be registered users
+# venues is the set of location names events can be added to, usually the names of the landmarks, or None for any
+# Returns the events read, {<event name>: <EventRecord>}, and their problems, [(<line number>, <message>), ...], in
+# which case nothing was added
+def import_events(event_store, events_file, file_format="csv", organiser="", venues=None, allow_clashes=False,
+                  now=None):
+    usernames = event_store.storage.read_credentials()
+    batch = {}
+    lines = {}  # {<event name>: <line number>}
+    problems = []
+
+    for line_number, row in read_rows(events_file, file_format):
+        if row is None:
+            problems.append((line_number, "Not an event"))
+            continue
+
+        row = {field: str(row.get(field) or "").strip() for field in fields}
+        event_name = row["name"]
+        row["organiser"] = row["organiser"] or organiser
+
+        try:
+            event_data = validate_event(event_name, row["venue"], row["organiser"], row["date"], row["time"],
+                                        row["duration"], row["description"], now)
+
+            if not row["venue"]:
+                raise InvalidEvent("Please fill all entries")
+
+            if venues is not None and row["venue"] not in venues:
+                raise InvalidEvent("Unknown venue : " + row["venue"])
+
+            if row["organiser"] not in usernames:
+                raise InvalidEvent("Unknown organiser : " + row["organiser"])
+
+            if event_name in event_store or event_name in batch:  # If the event name is already taken
+                raise InvalidEvent("Event name is already taken")
+        except InvalidEvent as error:
+            problems.append((line_number, str(error).replace("\n", " ")))
+            continue
+
+        batch[event_name] = event_data
+        lines[event_name] = line_number
+
+    if not problems and not allow_clashes:
+        clashes = find_clashes(event_store, batch)
+        problems = sorted((lines[event_name], "Clashes with " + clashes[event_name]) for event_name in clashes)
+
+    if not problems:
+        event_store.add_events(batch)
+
+    return batch, problems
+
+
+# Writes the events at venue (all events if venue is empty) that haven't ended, sorted by their timing, to an open CSV
+# or JSON Lines file
+# Returns the number of events written
+def export_events(event_store, events_file, file_format="csv", venue=""):
+    timeline = event_store.timeline_at(venue)
+    write_rows(events_file, file_format, timeline.items())
+
+    return len(timeline)
+
+
+# Opens the file at path for the command line, where "-" is the standard input or output, which is left open
+def open_events_file(path, mode):
+    if path == "-":
+        return contextlib.nullcontext(sys.stdin if mode == "r" else sys.stdout)
+
+    return open(path, mode, encoding="utf-8", newline="")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import and export of events, as CSV or JSON Lines")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="add the events of a file, with a single write")
+    import_parser.add_argument("path", help=".csv or .jsonl file, or - for CSV on the standard input")
+    import_parser.add_argument("--organiser", default="", help="username of the events without an organiser")
+    import_parser.add_argument("--allow-clashes", action="store_true", help="add events that clash with others")
+    import_parser.add_argument("--any-venue", action="store_true", help="add events at places that aren't landmarks")
+
+    export_parser = commands.add_parser("export", help="write the events that haven't ended, sorted by their timing")
+    export_parser.add_argument("path", help=".csv or .jsonl file, or - for CSV on the standard output")
+    export_parser.add_argument("--venue", default="", help="only export the events at this location")
+
+    arguments = parser.parse_args(argv)
+
+    storage = open_storage()
+    event_store = EventStore(storage, maintain=False)  # The application maintains the storage it uses
+
+    # Ended events don't count as clashes, and are left for the application to remove from the storage
+    event_store.expire()
+    event_store.expired.clear()
+
+    try:
+        if arguments.command == "import":
+            venues = None if arguments.any_venue else {landmark.name for landmark in load_landmarks()}
+
+            with open_events_file(arguments.path, "r") as events_file:
+                batch, problems = import_events(event_store, events_file, file_format(arguments.path),
+                                                organiser=arguments.organiser, venues=venues,
+                                                allow_clashes=arguments.allow_clashes)
+
+            for line_number, message in problems[:shown_problems]:
+                print("Line " + str(line_number) + " : " + message, file=sys.stderr)
+
+            if problems:
+                if len(problems) > shown_problems:
+                    print("... and " + str(len(problems) - shown_problems) + " more problems", file=sys.stderr)
+
+                print("No events were imported", file=sys.stderr)
+                return 1
+
+            print("Imported " + str(len(batch)) + " events", file=sys.stderr)
+        else:
+            with open_events_file(arguments.path, "w") as events_file:
+                exported = export_events(event_store, events_file, file_format(arguments.path), arguments.venue)
+
+            print("Exported " + str(exported) + " events", file=sys.stderr)
+    finally:
+        storage.close()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,549 @@
+# In-memory store for the events database
+# The storage backend is read once, and every change is written through to it
+# Changes are applied to the indexes straight away, and the writes are handed to the store's writer, which may run
+# them later on another thread, in order
+
+import sys
+from bisect import bisect_left, insort
+from heapq import heapify, heappop, heappush
+
+from interval_index import IntervalIndex
+from search_index import SearchIndex
+from datetime import datetime, timedelta
+
+# Format of an event entry : [<location name>, <organiser username>, <DD/MM/YYYY hh:mm>, <Description>, <Duration>]
+# The duration, in minutes, is optional, and events without one only take up the minute they start at
+# The store keeps every event as an EventRecord, which can still be read like an event entry
+
+initial_datetime = datetime(1970, 1, 1)
+
+
+# Returns the number of minutes elapsed from 1 January, 1970 to date_time
+def datetime_to_minutes(date_time):
+    return int((date_time - initial_datetime).total_seconds()) // 60
+
+
+# Converts a "DD/MM/YYYY hh:mm" timing to the number of minutes elapsed from 1 January, 1970
+def timing_to_minutes(timing):
+    event_date, event_time = timing.split()
+    event_datetime = datetime(*(tuple(int(i) for i in reversed(event_date.split("/"))) + tuple(
+        int(i) for i in event_time.split(":"))))
+
+    return datetime_to_minutes(event_datetime)
+
+
+# Returns the current minute, in the same units as timing_to_minutes
+def current_minutes():
+    return datetime_to_minutes(datetime.now())
+
+
+# The default writer of the events store, running writes to the storage straight away
+def write_now(function, *args):
+    return function(*args)
+
+
+# Converts a number of minutes elapsed from 1 January, 1970 to a "DD/MM/YYYY hh:mm" timing
+def minutes_to_timing(minutes):
+    return (initial_datetime + timedelta(minutes=minutes)).strftime("%d/%m/%Y %H:%M")
+
+
+# Returns the duration of an event in minutes, 0 if it doesn't have one
+def event_duration(event_data):
+    if len(event_data) > 4 and event_data[4]:
+        return int(event_data[4])
+
+    return 0
+
+
+# The data of an event, kept compact for stores holding many events
+# Venues and organisers are interned, so that each of them is held once however many events refer to it, and the
+# timing is parsed once, into the minute the event starts at
+# A record reads like an event entry (record[2] is the timing, iterating gives the fields), for the code that formats
+# events as entries
+# Records read from a snapshot (see snapshot.py) leave their description in it, and decode it whenever it is asked for
+class EventRecord:
+    __slots__ = ("venue", "organiser", "start", "text", "duration", "source")
+
+    def __init__(self, venue, organiser, start, description, duration=0, source=None):
+        self.venue = sys.intern(venue)
+        self.organiser = sys.intern(organiser)
+        self.start = start  # Minutes from 1 January, 1970
+        self.duration = duration  # In minutes, 0 for events without a duration
+
+        # The description, with its line breaks escaped as "\n" as in the event entries, or its entry number in the
+        # snapshot source
+        self.text = description
+        self.source = source
+
+    @property
+    def description(self):
+        if self.source is not None:
+            return self.source.description(self.text)
+
+        return self.text
+
+    # Returns the record of an event entry
+    @classmethod
+    def from_entry(cls, event_data):
+        return cls(event_data[0], event_data[1], timing_to_minutes(event_data[2]), event_data[3],
+                   event_duration(event_data))
+
+    @property
+    def timing(self):
+        return minutes_to_timing(self.start)
+
+    # Returns the number of minutes the event takes up, counting an event without a duration as taking up one minute
+    @property
+    def length(self):
+        return max(self.duration, 1)
+
+    # Returns the event entry of the record
+    def entry(self):
+        event_data = [self.venue, self.organiser, self.timing, self.description]
+
+        if self.duration:
+            event_data.append(str(self.duration))
+
+        return event_data
+
+    def __getitem__(self, index):
+        return self.entry()[index]
+
+    def __len__(self):
+        return 5 if self.duration else 4
+
+    def __iter__(self):
+        return iter(self.entry())
+
+    def __eq__(self, other):
+        if not isinstance(other, EventRecord):
+            return NotImplemented
+
+        return (self.venue, self.organiser, self.start, self.duration, self.description) == \
+            (other.venue, other.organiser, other.start, other.duration, other.description)
+
+    # Records are compared by their fields, and are never used as keys
+    __hash__ = None
+
+    def __repr__(self):
+        return "EventRecord(" + repr(self.entry())[1:-1] + ")"
+
+
+# Returns event_data as an EventRecord, converting it if it is an event entry
+def as_record(event_data):
+    return event_data if isinstance(event_data, EventRecord) else EventRecord.from_entry(event_data)
+
+
+# Returns a search index of events, without using the events store, so that it can be built on another thread
+def build_search_index(events):
+    search_index = SearchIndex()
+    search_index.add_many(events)
+
+    return search_index
+
+
+# load=False leaves the store empty, for a copy of it to be loaded on another thread and adopted (see start_loading)
+# maintain=False never starts the storage's housekeeping (see Storage.maintain), for processes that only read the events
+class EventStore:
+    def __init__(self, storage, writer=write_now, load=True, maintain=True):
+        self.storage = storage  # An instance of one of the backends in storage.py
+        self.writer = writer  # Called as writer(<storage method>, *<arguments>) for every write to the storage
+        self.maintain = maintain
+
+        self.events = {}  # {<event name>: <EventRecord>}
+        self.venue_index = {}  # {<location name>: {<event name>: <event data>}}
+        self.organiser_index = {}  # {<organiser username>: {<event name>: <event data>}}
+
+        # Events sorted by their timing, per venue ("" holds all the events)
+        # Format of a key : (<minutes from 1 January, 1970>, <insertion number>, <event name>)
+        # The insertion number keeps events with the same timing in the order they were added
+        self.time_index = {}  # {<location name>: [<key>, ...]}
+        self.time_keys = {}  # {<event name>: <key>}
+        self.insertions = 0
+
+        # The minutes taken up by the events at each venue, keyed by their time keys, for finding the events a new one
+        # would clash with
+        # A venue's index is built the first time clashes are looked for there, so loading the events doesn't build them
+        self.interval_index = {}  # {<location name>: <IntervalIndex>}
+
+        # Min-heap of the minutes at which the events end, for removing them as they end
+        # Format of a deadline : (<minute the event ends at>, <insertion number>, <event name>)
+        # Deadlines of removed or replaced events are left in the heap, and skipped when they no longer match the time
+        # key of an event
+        self.deadlines = []
+
+        # Ended events whose removal hasn't been written to the storage yet, as an ordered set
+        self.expired = {}  # {<event name>: None}
+
+        # Built on the first search, and kept up to date from then on
+        self.search_index = None
+
+        # Incremented by every change to the events, so that anything computed from them can tell when it is stale
+        self.generation = 0
+
+        # Changes made while a copy of the store is being loaded, to be applied to it when it is adopted
+        # Format of a change : (<event name>, <EventRecord, or None for a removal>)
+        self.journal = None  # [<change>, ...]
+
+        if load:
+            self.load()
+
+    def clear(self):
+        self.generation += 1
+        self.events = {}
+        self.venue_index = {}
+        self.organiser_index = {}
+        self.time_index = {}
+        self.time_keys = {}
+        self.interval_index = {}
+        self.deadlines = []
+        self.expired = {}
+        self.search_index = None
+
+    # Rebuilds all the indexes from events, a dictionary of all the events read from the storage, as records or
+    # entries
+    # The storage is read here if events isn't given
+    def load(self, events=None):
+        self.clear()
+
+        if events is None:
+            events = self.storage.read_events()
+
+        for event_name in events:
+            self.index_event(event_name, as_record(events[event_name]), keep_sorted=False)
+
+        self.rebuild_time_index()
+
+        if self.maintain:
+            self.storage.maintain(self.events)
+
+    # keep_sorted=False leaves the time index to be rebuilt afterwards, for adding many events at once
+    def index_event(self, event_name, event_data, keep_sorted=True):
+        self.generation += 1
+        self.events[event_name] = event_data
+        self.venue_index.setdefault(event_data.venue, {})[event_name] = event_data
+        self.organiser_index.setdefault(event_data.organiser, {})[event_name] = event_data
+
+        self.insertions += 1
+        time_key = (event_data.start, self.insertions, event_name)
+        self.time_keys[event_name] = time_key
+
+        if self.search_index is not None:
+            self.search_index.add(event_name, event_data)
+
+        if keep_sorted:
+            for venue in ("", event_data.venue):
+                insort(self.time_index.setdefault(venue, []), time_key)
+
+            venue_intervals = self.interval_index.get(event_data.venue)
+            if venue_intervals is not None:
+                venue_intervals.add(time_key, time_key[0] + event_data.length)
+
+            heappush(self.deadlines, (time_key[0] + event_data.length, self.insertions, event_name))
+
+    # Rebuilds the time index and the deadlines heap from all the events, and drops the interval indexes
+    def rebuild_time_index(self):
+        self.time_index = {}
+        self.interval_index = {}
+
+        for event_name in self.events:
+            event_data = self.events[event_name]
+            time_key = self.time_keys[event_name]
+            self.time_index.setdefault("", []).append(time_key)
+            self.time_index.setdefault(event_data.venue, []).append(time_key)
+
+        for venue_keys in self.time_index.values():
+            venue_keys.sort()
+
+        self.deadlines = [(time_key[0] + self.events[time_key[2]].length, time_key[1], time_key[2])
+                          for time_key in self.time_keys.values()]
+        heapify(self.deadlines)
+
+    def unindex_event(self, event_name, keep_sorted=True):
+        self.generation += 1
+        event_data = self.events.pop(event_name)
+
+        # Empty buckets are dropped so that the indexes don't grow with every venue or organiser ever seen
+        for index, key in ((self.venue_index, event_data.venue), (self.organiser_index, event_data.organiser)):
+            del index[key][event_name]
+            if not index[key]:
+                del index[key]
+
+        time_key = self.time_keys.pop(event_name)
+
+        if self.search_index is not None:
+            self.search_index.remove(event_name)
+
+        if keep_sorted:
+            for venue in ("", event_data.venue):
+                venue_keys = self.time_index[venue]
+                del venue_keys[bisect_left(venue_keys, time_key)]
+                if not venue_keys:
+                    del self.time_index[venue]
+
+            venue_intervals = self.interval_index.get(event_data.venue)
+            if venue_intervals is not None:
+                venue_intervals.remove(time_key)
+                if not venue_intervals:
+                    del self.interval_index[event_data.venue]
+
+        return event_data
+
+    def __contains__(self, event_name):
+        return event_name in self.events
+
+    def __len__(self):
+        return len(self.events)
+
+    def get(self, event_name):
+        return self.events.get(event_name)
+
+    # Returns a dictionary of the events being organized at venue (all events if venue is empty)
+    def events_at(self, venue=""):
+        if venue == "":
+            return dict(self.events)
+
+        return dict(self.venue_index.get(venue, {}))
+
+    # Returns a dictionary of all the events at venue (all events if venue is empty), sorted by their timing
+    # Events are removed as they end, so these are the events that haven't ended yet
+    def timeline_at(self, venue=""):
+        return {time_key[2]: self.events[time_key[2]] for time_key in self.time_index.get(venue, [])}
+
+    # Returns a dictionary of the events at venue (all events if venue is empty) whose timing is at or after
+    # the minute `after`, sorted by their timing
+    def upcoming_at(self, venue="", after=None):
+        if after is None:
+            after = current_minutes()
+
+        venue_keys = self.time_index.get(venue, [])
+        start = bisect_left(venue_keys, (after,))
+
+        return {time_key[2]: self.events[time_key[2]] for time_key in venue_keys[start:]}
+
+    # Returns a dictionary of the events at venue that overlap the `length` minutes starting at the minute `start`,
+    # sorted by their timing
+    # Only the events overlapping them are visited, however long the other events at the venue are (see
+    # interval_index.py)
+    def clashes_at(self, venue, start, length=1):
+        venue_keys = self.time_index.get(venue)
+        if not venue_keys or not venue:
+            return {}
+
+        venue_intervals = self.interval_index.get(venue)
+        if venue_intervals is None:
+            venue_intervals = IntervalIndex([(time_key, time_key[0] + self.events[time_key[2]].length)
+                                             for time_key in venue_keys])
+            self.interval_index[venue] = venue_intervals
+
+        return {time_key[2]: self.events[time_key[2]]
+                for time_key in venue_intervals.overlapping(start, start + max(length, 1))}
+
+    # Returns the set of names of the events with, for every word of query, a word of their name, description or
+    # organiser starting with it
+    def search(self, query):
+        if self.search_index is None:
+            self.search_index = build_search_index(self.events)
+
+        return self.search_index.search(query)
+
+    # Starts using a search index built on another thread from snapshot, a copy of the events, by build_search_index
+    # The index is brought up to date with the changes made to the events since the snapshot was taken
+    def attach_search_index(self, search_index, snapshot):
+        if self.search_index is not None:
+            return
+
+        for event_name in snapshot:
+            if self.events.get(event_name) is not snapshot[event_name]:
+                search_index.remove(event_name)
+
+        for event_name in self.events:
+            if event_name not in search_index.event_words:
+                search_index.add(event_name, self.events[event_name])
+
+        self.search_index = search_index
+
+    # Returns a dictionary of the events being organized by organiser
+    def events_by(self, organiser):
+        return dict(self.organiser_index.get(organiser, {}))
+
+    # Whether a copy of the store is being loaded, to be adopted
+    @property
+    def loading(self):
+        return self.journal is not None
+
+    # Starts recording the changes made to the store, until a copy of it loaded from the storage is adopted
+    # Must be called when the copy's read of the storage is handed to the writer, so that the changes recorded are
+    # exactly the ones written after that read
+    def start_loading(self):
+        self.journal = []
+
+    # Takes the events and indexes of loaded, a store loaded from the storage since start_loading was called, and
+    # applies to them the changes made meanwhile, which were already written
+    def adopt(self, loaded):
+        journal = self.journal or []
+        self.journal = None
+
+        for event_name, event_data in journal:
+            if event_name in loaded.events:
+                loaded.unindex_event(event_name)
+
+            if event_data is not None:
+                loaded.index_event(event_name, event_data)
+
+        self.events = loaded.events
+        self.venue_index = loaded.venue_index
+        self.organiser_index = loaded.organiser_index
+        self.time_index = loaded.time_index
+        self.time_keys = loaded.time_keys
+        self.insertions = loaded.insertions
+        self.interval_index = loaded.interval_index
+        self.deadlines = loaded.deadlines
+        self.search_index = loaded.search_index
+        self.generation += loaded.generation + 1
+
+    # Applies changes read from the storage (see Storage.read_changes), which other processes made and wrote, without
+    # writing them again
+    # Returns a dictionary of the events that changed, with their records before the changes (None for new events)
+    def apply_changes(self, changes):
+        changed = {}
+
+        for event_name, event_data in changes:
+            current = self.events.get(event_name)
+
+            # Changes that leave the event as it is, such as another process writing the same record, change nothing
+            if event_data == current:
+                continue
+
+            if current is not None:
+                self.unindex_event(event_name)
+
+            if event_data is not None:
+                # The event mustn't be removed by the pending removal of an ended event with the same name
+                self.expired.pop(event_name, None)
+                self.index_event(event_name, event_data)
+
+            changed.setdefault(event_name, current)
+
+        return changed
+
+    # Adds a new event, given as a record or an entry, and writes it to the storage
+    # The indexes are always updated before the write, so they never lag behind the storage, which background
+    # maintenance relies on
+    # Returns what the writer returns for the write
+    def add_event(self, event_name, event_data):
+        event_data = as_record(event_data)
+
+        # The new event mustn't be removed by the pending removal of an ended event with the same name
+        self.expired.pop(event_name, None)
+
+        if event_name in self.events:
+            self.unindex_event(event_name)
+
+        self.index_event(event_name, event_data)
+
+        if self.journal is not None:
+            self.journal.append((event_name, event_data))
+
+        return self.writer(self.storage.write_event, event_name, event_data)
+
+    # Adds many new events, {<event name>: <record or entry>}, with a single write to the storage
+    # The time indexes are rebuilt once instead of keeping them sorted for every event, which only sorts the new keys
+    # into the already sorted ones
+    # Returns what the writer returns for the write
+    def add_events(self, events):
+        events = {event_name: as_record(events[event_name]) for event_name in events}
+        if not events:
+            return None
+
+        for event_name in events:
+            self.expired.pop(event_name, None)
+
+            if event_name in self.events:
+                self.unindex_event(event_name)
+
+            self.index_event(event_name, events[event_name], keep_sorted=False)
+
+        self.rebuild_time_index()
+
+        if self.journal is not None:
+            self.journal.extend(events.items())
+
+        return self.writer(self.storage.write_events, events)
+
+    def remove_event(self, event_name):
+        removed = self.remove_events([event_name])
+        return removed.get(event_name)
+
+    # Removes many events with a single write to the storage
+    # Returns a dictionary of the removed events
+    def remove_events(self, event_names):
+        event_names = [event_name for event_name in dict.fromkeys(event_names) if event_name in self.events]
+        if not event_names:
+            return {}
+
+        removed = {event_name: self.unindex_event(event_name) for event_name in event_names}
+
+        if self.journal is not None:
+            self.journal.extend((event_name, None) for event_name in event_names)
+
+        self.writer(self.storage.delete_events, event_names)
+        if self.maintain:
+            self.writer(self.storage.maintain, self.events)
+
+        return removed
+
+    # Returns the minute at which the next event ends, or None if there are no events
+    def next_deadline(self):
+        while self.deadlines:
+            deadline = self.deadlines[0]
+
+            # Skipping the deadlines of removed or replaced events
+            if self.time_keys.get(deadline[2], (None, None))[1] == deadline[1]:
+                return deadline[0]
+
+            heappop(self.deadlines)
+
+        return None
+
+    # Removes the events that have ended by the minute `now` from the indexes, and returns a dictionary of them
+    # Their removal is only written to the storage by write_expired, since an ended event is removed again whenever
+    # the storage is read
+    def expire(self, now=None):
+        if now is None:
+            now = current_minutes()
+
+        ended = {}
+
+        while True:
+            deadline = self.next_deadline()
+            if deadline is None or deadline > now:
+                break
+
+            event_name = heappop(self.deadlines)[2]
+            ended[event_name] = self.unindex_event(event_name)
+            self.expired[event_name] = None
+
+            if self.journal is not None:
+                self.journal.append((event_name, None))
+
+        return ended
+
+    # Writes the removal of the ended events to the storage, with a single write
+    def write_expired(self):
+        if not self.expired:
+            return
+
+        event_names = list(self.expired)
+        self.expired = {}
+
+        self.writer(self.storage.delete_events, event_names)
+        if self.maintain:
+            self.writer(self.storage.maintain, self.events)
+
+    # Removes the events that have ended by the minute `before`, and writes their removal to the storage
+    def prune(self, before=None):
+        ended = self.expire(before)
+        self.write_expired()
+
+        return ended
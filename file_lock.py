@@ -0,0 +1,79 @@
+# Advisory locking of the files shared by several instances of the application, for example kiosks using the same
+# events.txt on a shared directory
+# The lock is taken on a separate lock file, with fcntl.flock where it is available and msvcrt.locking on Windows
+# Locks are advisory : they only exclude the processes that take them too, which every instance of the application does
+
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+# A lock held by at most one thread of one process at a time
+# It is reentrant, like threading.RLock, so it can replace the storage's lock and be taken again by nested writes
+class FileLock:
+    def __init__(self, path):
+        self.path = path
+        self.thread_lock = threading.RLock()
+        self.lock_file = None  # Opened on the first acquisition, and kept open
+        self.depth = 0  # Number of nested acquisitions by the thread holding the lock
+
+    def acquire(self):
+        self.thread_lock.acquire()
+
+        try:
+            if self.depth == 0:
+                self.lock_file_acquire()
+        except BaseException:
+            self.thread_lock.release()
+            raise
+
+        self.depth += 1
+
+    def release(self):
+        self.depth -= 1
+
+        try:
+            if self.depth == 0:
+                self.lock_file_release()
+        finally:
+            self.thread_lock.release()
+
+    def lock_file_acquire(self):
+        if self.lock_file is None:
+            self.lock_file = open(self.path, "a+b")
+
+        if fcntl is not None:
+            fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            # msvcrt.locking gives up after about 10 seconds, so it is retried until the lock is free
+            self.lock_file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(self.lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+
+    def lock_file_release(self):
+        if fcntl is not None:
+            fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_UN)
+        else:
+            self.lock_file.seek(0)
+            msvcrt.locking(self.lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def close(self):
+        with self.thread_lock:
+            if self.lock_file is not None:
+                self.lock_file.close()
+                self.lock_file = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
@@ -0,0 +1,166 @@
+# Index of intervals, for finding the events overlapping a new event without going through those that end before it
+# The intervals are kept in a treap (a binary search tree balanced by random priorities) ordered by their keys, and
+# every node holds the latest end in its subtree, so whole subtrees ending before a query are skipped
+# Adding or removing an interval takes O(log N) steps on average, and finding the k intervals overlapping a query
+# O((1 + k) log N), however long the intervals are
+# Keys are tuples starting with the interval's start, like the events store's time keys
+
+import random
+
+
+class IntervalNode:
+    __slots__ = ("key", "end", "priority", "left", "right", "max_end")
+
+    def __init__(self, key, end):
+        self.key = key
+        self.end = end
+        self.priority = random.random()
+        self.left = None
+        self.right = None
+        self.max_end = end
+
+
+# Recomputes the latest end in the subtree of node, from its children's
+def update(node):
+    max_end = node.end
+
+    if node.left is not None and node.left.max_end > max_end:
+        max_end = node.left.max_end
+
+    if node.right is not None and node.right.max_end > max_end:
+        max_end = node.right.max_end
+
+    node.max_end = max_end
+
+
+# Splits the subtree of node into the subtrees of the keys before key, and of the others
+def split(node, key):
+    if node is None:
+        return None, None
+
+    if node.key < key:
+        node.right, right = split(node.right, key)
+        update(node)
+        return node, right
+
+    left, node.left = split(node.left, key)
+    update(node)
+    return left, node
+
+
+# Joins two subtrees, all of whose keys in left are before those in right
+def merge(left, right):
+    if left is None:
+        return right
+
+    if right is None:
+        return left
+
+    if left.priority > right.priority:
+        left.right = merge(left.right, right)
+        update(left)
+        return left
+
+    right.left = merge(left, right.left)
+    update(right)
+    return right
+
+
+def insert(node, new_node):
+    if node is None:
+        return new_node
+
+    if new_node.priority > node.priority:
+        new_node.left, new_node.right = split(node, new_node.key)
+        update(new_node)
+        return new_node
+
+    if new_node.key < node.key:
+        node.left = insert(node.left, new_node)
+    else:
+        node.right = insert(node.right, new_node)
+
+    update(node)
+    return node
+
+
+def delete(node, key):
+    if node is None:
+        raise KeyError(key)
+
+    if key == node.key:
+        return merge(node.left, node.right)
+
+    if key < node.key:
+        node.left = delete(node.left, key)
+    else:
+        node.right = delete(node.right, key)
+
+    update(node)
+    return node
+
+
+class IntervalIndex:
+    # intervals, if given, are the first intervals of the index, sorted by their keys : [(<key>, <end>), ...]
+    def __init__(self, intervals=()):
+        self.root = None
+        self.size = 0
+
+        # Building the treap of sorted intervals in one pass, keeping the nodes of its rightmost path on a stack
+        stack = []
+
+        for key, end in intervals:
+            node = IntervalNode(key, end)
+            last = None
+
+            while stack and stack[-1].priority < node.priority:
+                last = stack.pop()
+
+                # The popped nodes' subtrees are complete
+                update(last)
+
+            node.left = last
+            if stack:
+                stack[-1].right = node
+
+            stack.append(node)
+            self.size += 1
+
+        for node in reversed(stack):
+            update(node)
+
+        if stack:
+            self.root = stack[0]
+
+    def __len__(self):
+        return self.size
+
+    # Adds the interval from key[0] up to, but not including, end
+    def add(self, key, end):
+        self.root = insert(self.root, IntervalNode(key, end))
+        self.size += 1
+
+    def remove(self, key):
+        self.root = delete(self.root, key)
+        self.size -= 1
+
+    # Returns the keys of the intervals overlapping the interval from start up to, but not including, end, sorted
+    def overlapping(self, start, end):
+        keys = []
+
+        def visit(node):
+            # Nothing in the subtree ends after start
+            if node is None or node.max_end <= start:
+                return
+
+            visit(node.left)
+
+            # The keys after node start at or after it, so none of them starts before end if node doesn't
+            if node.key[0] < end:
+                if node.end > start:
+                    keys.append(node.key)
+
+                visit(node.right)
+
+        visit(self.root)
+        return keys
@@ -0,0 +1,51 @@
+# Runs the application's file and database I/O off the Kivy main thread
+# Everything submitted runs on a single worker thread, in the order it was submitted, so that writes never interleave
+# and a read always sees the writes submitted before it
+# Results are handed back to the main thread through the Clock, so callbacks can safely update widgets
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from kivy.clock import Clock
+from kivy.logger import Logger
+
+
+class IOExecutor:
+    def __init__(self, on_error=None):
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="event-mapper-io")
+
+        # Called on the main thread with the exception of any submitted function that fails, unless the function was
+        # submitted with its own on_error
+        self.on_error = on_error
+
+    # Runs function(*args) on the worker thread, then on_done(<its result>) on the main thread
+    # Returns a concurrent.futures.Future of the result
+    def submit(self, function, *args, on_done=None, on_error=None):
+        future = self.pool.submit(function, *args)
+        future.add_done_callback(lambda done: Clock.schedule_once(partial(self.deliver, done, on_done, on_error)))
+
+        return future
+
+    # Lets the executor be used as the events store's writer
+    def __call__(self, function, *args):
+        return self.submit(function, *args)
+
+    # Calls callback on the main thread once everything submitted so far has finished
+    def after_pending(self, callback):
+        return self.submit(lambda: None, on_done=lambda result: callback())
+
+    def deliver(self, future, on_done, on_error, dt):
+        error = future.exception()
+
+        if error is not None:
+            Logger.error("IOExecutor: " + repr(error))
+
+            on_error = on_error or self.on_error
+            if on_error:
+                on_error(error)
+        elif on_done:
+            on_done(future.result())
+
+    # Waits for everything submitted to finish, so that no write is lost when the application closes
+    def shutdown(self):
+        self.pool.shutdown(wait=True)
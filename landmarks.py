@@ -0,0 +1,163 @@
+# The landmarks of the campus map, read from landmarks.json, and a grid index for finding the landmark under a point
+# Also holds the geometry used to draw all the landmarks with a few meshes : packing their labels into shared textures,
+# and building the vertices of many quads at once
+# Format of landmarks.json : [{"name": <location name>, "x": <center x>, "y": <center y>, "width": <width>,
+#                              "height": <height>, "label": <text shown on the map, the name if missing>}, ...]
+# Positions and sizes are fractions of the map image's width and height, measured from its bottom left corner
+# The name of a landmark is the location name its events are stored under
+
+import json
+
+# NumPy is optional, and lays out all the landmarks in one pass when it is installed
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+landmarks_path = "landmarks.json"
+
+# Number of columns and rows of the grid index
+grid_cells = 64
+
+
+class Landmark:
+    __slots__ = ("name", "label", "x", "y", "width", "height", "left", "bottom", "right", "top")
+
+    def __init__(self, name, x, y, width, height, label=None):
+        self.name = name
+        self.label = name if label is None else label
+
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+
+        self.left = x - width / 2
+        self.bottom = y - height / 2
+        self.right = x + width / 2
+        self.top = y + height / 2
+
+    def contains(self, x, y):
+        return self.left <= x <= self.right and self.bottom <= y <= self.top
+
+
+# Returns the list of landmarks in the landmarks file
+def load_landmarks(path=landmarks_path):
+    with open(path, "r") as landmarks_file:
+        return [Landmark(entry["name"], entry["x"], entry["y"], entry["width"], entry["height"], entry.get("label"))
+                for entry in json.load(landmarks_file)]
+
+
+# A uniform grid over the map, where every cell lists the landmarks overlapping it
+# A point is only tested against the few landmarks of its cell, however many landmarks there are
+class LandmarkIndex:
+    def __init__(self, landmarks, cells=grid_cells):
+        self.landmarks = list(landmarks)
+        self.cells = cells
+        self.grid = {}  # {(<column>, <row>): [<landmark>, ...]}
+
+        # The rectangle of every landmark, in the order of self.landmarks
+        # Format of geometry : [[<left>, <bottom>, <width>, <height>], ...]
+        geometry = [[landmark.left, landmark.bottom, landmark.width, landmark.height] for landmark in self.landmarks]
+        self.geometry = numpy.array(geometry, dtype=float).reshape(-1, 4) if numpy is not None else geometry
+
+        for landmark in self.landmarks:
+            for column in range(self.cell_of(landmark.left), self.cell_of(landmark.right) + 1):
+                for row in range(self.cell_of(landmark.bottom), self.cell_of(landmark.top) + 1):
+                    self.grid.setdefault((column, row), []).append(landmark)
+
+    # Lays out all the landmarks, in the order of self.landmarks, on a map drawn at map_x, map_y with the size
+    # map_width, map_height, given the sizes of their labels : [[<label width>, <label height>], ...]
+    # Returns their rectangles, [[<x>, <y>, <width>, <height>], ...], and the positions centering their labels on them,
+    # [[<x>, <y>], ...]
+    def layout(self, map_x, map_y, map_width, map_height, label_sizes):
+        if numpy is not None:
+            rectangles = self.geometry * (map_width, map_height, map_width, map_height) + (map_x, map_y, 0, 0)
+            label_positions = rectangles[:, :2] + (rectangles[:, 2:] - numpy.array(label_sizes).reshape(-1, 2)) / 2
+
+            return rectangles.tolist(), label_positions.tolist()
+
+        rectangles = [[map_x + left * map_width, map_y + bottom * map_height, width * map_width, height * map_height]
+                      for left, bottom, width, height in self.geometry]
+        label_positions = [[x + (width - label_width) / 2, y + (height - label_height) / 2]
+                           for (x, y, width, height), (label_width, label_height) in zip(rectangles, label_sizes)]
+
+        return rectangles, label_positions
+
+    # Returns the column or row of the grid holding a coordinate, clamped to the map
+    def cell_of(self, coordinate):
+        return min(self.cells - 1, max(0, int(coordinate * self.cells)))
+
+    # Returns the landmark at the point (x, y) of the map, or None
+    # The smallest landmark wins where landmarks overlap, so that rooms can be picked inside their buildings
+    def landmark_at(self, x, y):
+        if not (0 <= x <= 1 and 0 <= y <= 1):
+            return None
+
+        found = None
+
+        for landmark in self.grid.get((self.cell_of(x), self.cell_of(y)), ()):
+            if landmark.contains(x, y) and (found is None or
+                                            landmark.width * landmark.height < found.width * found.height):
+                found = landmark
+
+        return found
+
+
+# Packs rectangles of the given sizes in rows ("shelves") on pages of the given width and at most max_height high,
+# leaving padding pixels around each of them
+# Returns the position of every rectangle, [(<page>, <x>, <y>), ...], and the height used on every page
+def pack_shelves(sizes, width, max_height, padding=1):
+    positions = []
+    page_heights = [0]
+    x = y = shelf_height = 0
+
+    for rectangle_width, rectangle_height in sizes:
+        rectangle_width, rectangle_height = rectangle_width + 2 * padding, rectangle_height + 2 * padding
+
+        # Starting a new shelf when the rectangle doesn't fit in the current one, and a new page when the shelf doesn't
+        if x + rectangle_width > width:
+            x, y, shelf_height = 0, y + shelf_height, 0
+
+        if y + rectangle_height > max_height and y > 0:
+            page_heights.append(0)
+            x = y = shelf_height = 0
+
+        positions.append((len(page_heights) - 1, x + padding, y + padding))
+
+        x += rectangle_width
+        shelf_height = max(shelf_height, rectangle_height)
+        page_heights[-1] = max(page_heights[-1], y + shelf_height)
+
+    return positions, page_heights
+
+
+# Returns the vertices and indices of a Mesh drawing quads in the "triangles" mode, with the vertex format (x, y, u, v)
+# Format of rectangles : [[<x>, <y>, <width>, <height>], ...]
+# Format of regions, the part of the texture drawn on each rectangle : [[<u>, <v>, <u width>, <v height>], ...]
+def quad_mesh(rectangles, regions):
+    if numpy is not None:
+        rectangles = numpy.array(rectangles, dtype=float).reshape(-1, 4)
+        regions = numpy.array(regions, dtype=float).reshape(-1, 4)
+
+        x0, y0 = rectangles[:, 0], rectangles[:, 1]
+        x1, y1 = x0 + rectangles[:, 2], y0 + rectangles[:, 3]
+        u0, v0 = regions[:, 0], regions[:, 1]
+        u1, v1 = u0 + regions[:, 2], v0 + regions[:, 3]
+
+        # The corners of every quad, counterclockwise from the bottom left one
+        vertices = numpy.stack([x0, y0, u0, v0, x1, y0, u1, v0, x1, y1, u1, v1, x0, y1, u0, v1], axis=1)
+        first_corners = numpy.arange(len(rectangles)).reshape(-1, 1) * 4
+        indices = first_corners + (0, 1, 2, 2, 3, 0)
+
+        return vertices.ravel().tolist(), indices.ravel().tolist()
+
+    vertices = []
+    indices = []
+
+    for quad, ((x, y, width, height), (u, v, u_width, v_height)) in enumerate(zip(rectangles, regions)):
+        vertices += [x, y, u, v, x + width, y, u + u_width, v, x + width, y + height, u + u_width, v + v_height,
+                     x, y + height, u, v + v_height]
+        indices += [4 * quad + corner for corner in (0, 1, 2, 2, 3, 0)]
+
+    return vertices, indices
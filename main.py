@@ -1,9 +1,33 @@
 # Importing Standard Library modules
 
 import hashlib
+import json
+import math
+import os
 import string
+import sys
+import time
+from collections import OrderedDict
 from functools import partial
-from datetime import datetime
+from datetime import datetime, timedelta
+
+# Importing local modules
+
+from event_store import EventStore, build_search_index, initial_datetime
+from event_io import InvalidEvent, validate_event
+from storage import CredentialCache, ReloadNeeded, open_storage
+
+# The headless server (see server.py) is started before anything imports Kivy, so that it runs without a display
+if __name__ == "__main__" and "--serve" in sys.argv:
+    from server import main as serve
+    sys.exit(serve(sys.argv[1:]))
+
+from io_executor import IOExecutor
+from landmarks import LandmarkIndex, load_landmarks, pack_shelves, quad_mesh
+from profiling import configure as configure_profiling, profiler
+
+# The profiling flags are taken out of the command line before Kivy parses it
+configure_profiling(sys.argv)
 
 # Importing Kivy objects
 
@@ -14,27 +38,50 @@ from kivy.uix.textinput import TextInput
 from kivy.graphics.transformation import Matrix
 from kivy.clock import Clock
 from kivy.uix.button import Button
-from kivy.uix.image import Image
+from kivy.uix.image import Image, AsyncImage
 from kivy.uix.popup import Popup
-from kivy.uix.scrollview import ScrollView
 from kivy.uix.floatlayout import FloatLayout
-from kivy.uix.gridlayout import GridLayout
 from kivy.uix.scatterlayout import ScatterLayout
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
+from kivy.factory import Factory
+from kivy.properties import ObjectProperty, StringProperty
+from kivy.uix.widget import Widget
+from kivy.core.image import Image as CoreImage
+from kivy.core.text import Label as CoreLabel
+from kivy.loader import Loader
+from kivy.graphics import ClearBuffers, ClearColor, Color, Fbo, InstructionGroup, Mesh, Rectangle
+from kivy.logger import Logger
 from kivy.core.text import LabelBase
 from kivy.core.window import Window
 from kivy.metrics import dp
 
 # Font management
 
-LabelBase.register(name="AlexBrush", fn_regular="fonts/AlexBrush-Regular.ttf")
-LabelBase.register(name="Quicksand-Bold", fn_regular="fonts/Quicksand-Bold.otf")
-LabelBase.register(name="OstrichSans-Bold", fn_regular="fonts/OstrichSans-Bold.otf",
-                   fn_bold="fonts/OstrichSans-Black.otf")
-LabelBase.register(name="OpenSans", fn_regular="fonts/OpenSans-Regular.ttf", fn_bold="fonts/OpenSans-Semibold.ttf")
-LabelBase.register(name="CamingoCode", fn_regular="fonts/CamingoCode-Regular.ttf", fn_bold="fonts/CamingoCode-Bold.ttf")
-LabelBase.register(name="CooperHewitt", fn_regular="fonts/CooperHewitt-Medium.otf",
-                   fn_bold="fonts/CooperHewitt-Semibold.otf")
-LabelBase.register(name="FiraSans", fn_regular="fonts/FiraSans-Book.otf")
+# Fonts used by the application, registered with Kivy by register_fonts
+fonts_dict = {
+    "AlexBrush": {"fn_regular": "fonts/AlexBrush-Regular.ttf"},
+    "Quicksand-Bold": {"fn_regular": "fonts/Quicksand-Bold.otf"},
+    "OstrichSans-Bold": {"fn_regular": "fonts/OstrichSans-Bold.otf", "fn_bold": "fonts/OstrichSans-Black.otf"},
+    "OpenSans": {"fn_regular": "fonts/OpenSans-Regular.ttf", "fn_bold": "fonts/OpenSans-Semibold.ttf"},
+    "CamingoCode": {"fn_regular": "fonts/CamingoCode-Regular.ttf", "fn_bold": "fonts/CamingoCode-Bold.ttf"},
+    "CooperHewitt": {"fn_regular": "fonts/CooperHewitt-Medium.otf", "fn_bold": "fonts/CooperHewitt-Semibold.otf"},
+    "FiraSans": {"fn_regular": "fonts/FiraSans-Book.otf"}
+}
+
+# Fonts needed for the first frame, the rest are registered once the starting page is displayed
+starting_page_fonts = ["AlexBrush", "Quicksand-Bold"]
+
+registered_fonts = set()
+
+
+# Registers the fonts in font_names (all fonts by default) that haven't been registered yet
+def register_fonts(font_names=None):
+    for font_name in font_names or fonts_dict:
+        if font_name not in registered_fonts:
+            LabelBase.register(name=font_name, **fonts_dict[font_name])
+            registered_fonts.add(font_name)
+
 
 # Color Management
 
@@ -53,92 +100,162 @@ red = (1, 0.1, 0.1, 1)
 pastel_red = (1, 0.296, 0.249, 1)
 
 transparent = (0, 0, 0, 0)
+translucent_orange = (1, 0.678, 0, 0.45)  # Background of the landmarks with events matching a search
 
-# pos_hint of different landmarks (buttons) with respect to the Nila Map
-relative_coordinates_dict = {
-    "Agora": (0.8787, 0.1617),
-    "Samgatha": (0.7487, 0.2804),
-    "Manogatha": (0.6, 0.37),
-    "Kaapi": (0.5432, 0.455),
-    "Bageshri": (0.395, 0.685),
-    "Shikharam": (0.2866, 0.894),
-    "Brindavani": (0.1172, 0.8568),
-    "Tilang B": (0.1913, 0.705),
-    "Tilang A": (0.2773, 0.555),
-    "Tilang Mess": (0.2425, 0.63),
-    "Tilang Parking": (0.385, 0.5925),
-    "Main Parking": (0.89, 0.355)
-}
+map_image_path = "images/nila_map.png"
 
-# size_hint of different landmarks (buttons) with respect to the Nila Map
-# defined for 800/600 pixels screen
-size_hints_dict = {
-    'Agora': (0.1, 0.11),
-    'Samgatha': (0.105, 0.13),
-    'Manogatha': (0.15, 0.12),
-    'Kaapi': (0.07, 0.05),
-    'Bageshri': (0.08, 0.1),
-    'Shikharam': (0.09, 0.115),
-    'Brindavani': (0.15, 0.2),
-    'Tilang B': (0.09, 0.1),
-    'Tilang A': (0.08, 0.1),
-    'Tilang Mess': (0.12, 0.055),
-    'Tilang Parking': (0.08, 0.065),
-    'Main Parking': (0.125, 0.07)
-}
+# map_image_width / map_image_height
+# map image resolution is 10000 x 8800 pixels
+map_aspect_ratio = 10 / 8.8
 
-buttons_names = list(relative_coordinates_dict.keys())
+# A tap that moves by more than this many pixels pans the map instead of opening a landmark
+tap_distance = dp(10)
+
+# Location of the tile pyramid of the Nila map, generated by make_tiles.py
+tiles_directory = "images/tiles"
+tile_cache_size = 96  # Maximum number of tile textures kept in memory
+landmark_layout_cache_size = 8  # Maximum number of window sizes the landmarks' layout is kept for
+atlas_width = 2048  # Size of the textures the landmarks' labels are packed into
+atlas_height = 2048
+mesh_quads = 16384  # Maximum number of quads drawn by one mesh, whose vertices are numbered with 16 bits
 
 # Global variable to keep track of the currently logged in user (or visitor)
 current_username = ""
 
+# The storage backend for the events and credentials databases (selected through EVENT_MAPPER_STORAGE)
+storage = open_storage()
+
+
+# Called when a write to the storage fails
+# The events store is read again from the storage, to undo the changes that couldn't be saved
+def storage_error(error):
+    popup_pool.acquire("error").show("Your changes could not be saved")
+    load_events()
+
+
+# Loads the events store from the storage on the I/O thread, so that neither starting the application nor reloading
+# the events waits for it
+# The changes made to the events store while it loads are applied to the loaded events (see EventStore.adopt)
+def load_events():
+    event_store.start_loading()
+    io_executor.submit(EventStore, storage, on_done=events_loaded, on_error=load_failed)
+
+
+def events_loaded(loaded):
+    event_store.adopt(loaded)
+    change_watcher.start()
+    update_events_file()
+    expiry_timer.reschedule()
+
+    map_screen = built_map_screen()
+    if map_screen is not None:
+        map_screen.event_counts_trigger()
+
+
+# Called when the events can't be read from the storage
+# The failure is only reported once : the events aren't read again, and other instances' changes aren't checked for,
+# until a later load succeeds, since the storage would fail the same way every time
+def load_failed(error):
+    event_store.journal = None
+    change_watcher.stop()
+
+    Logger.error("Storage: The events could not be read: " + repr(error))
+    popup_pool.acquire("error").show("The events could not be read")
+
+
+# Returns the map screen, or None while the map page hasn't been built, which is only done once it is first opened
+def built_map_screen():
+    app = App.get_running_app()
+    if app is None or app.root is None or not app.root.has_screen("map"):
+        return None
+
+    return app.root.get_screen("map").map_parent.map_screen
+
+
+# Every read and write of the storage made after the application starts runs on this executor's worker thread
+io_executor = IOExecutor(on_error=storage_error)
+
+# The events database, indexed by event name, venue and organiser, and empty until load_events has loaded it
+# Changes to the events are applied in memory straight away, and written to the storage by io_executor
+event_store = EventStore(storage, writer=io_executor, load=False)
+
+# The credentials database, re-read only when it is changed on disk
+credentials = CredentialCache(storage)
+
 username_acceptable = string.ascii_letters + string.digits + "@_"  # String of characters acceptable in a username
 password_acceptable = username_acceptable + "$#*-"  # String of characters acceptable in a password
 
 
 # Some useful functions
 
-# Returns if `year` is a leap year or not
-def is_leap(year):
-    return year % 400 == 0 or (year % 4 == 0 and year % 100 != 0)
+@profiler.timed("login.hash")
+def hash_password(password):
+    return hashlib.sha512(password.encode()).hexdigest()
 
 
-# Used as a key for sorting events by their timing
-def comparison_function(input_list):
-    return input_list[-1]
+# Returns the hashed password of username, or None if the username doesn't exist, and is run on io_executor
+@profiler.timed("login.lookup")
+def lookup_credentials(username):
+    return credentials.get(username)
 
 
-# Reads the events database and returns a dictionary for events being organized at venue
-def obtain_events(venue=""):
-    with open("events.txt", "r") as events_file:
-        data = [entry for entry in events_file.read().split("\n")[:-1]]
+# Records the time from start to the end of the next frame drawn, under name
+def record_until_frame(name, start):
+    def frame_drawn(*args):
+        Window.funbind("on_flip", frame_drawn)
+        profiler.record(name, time.perf_counter() - start)
 
-    output_dict = {}
+    Window.fbind("on_flip", frame_drawn)
 
-    for entry in data:
-        event_name, other = entry.split("||")
-        extracted_data = other.split("|")
 
-        if venue == "" or extracted_data[0] == venue:
-            output_dict[event_name] = extracted_data
+# A rolling summary of the profiled measurements, drawn above every screen while profiling is on
+class ProfilerOverlay(Label):
+    # Measurements shown by the overlay, in order
+    shown = ("frame", "search", "tap", "tap.query", "tap.split", "tap.rows", "tap.popup", "tap.frame",
+             "submit", "submit.clashes", "submit.write", "login.lookup", "login.hash")
 
-    return output_dict
+    def __init__(self, **kwargs):
+        super(ProfilerOverlay, self).__init__(font_name="CamingoCode",
+                                              font_size=14,
+                                              halign="left",
+                                              valign="top",
+                                              size_hint=(None, None),
+                                              color=white,
+                                              **kwargs)
 
+        self.bind(texture_size=self.setter("size"))
 
-# Filters events to allow only those whose timing is after the current timing
-def filter_events(events_dict):
-    filtered_events_dict = {}
+        with self.canvas.before:
+            Color(0, 0, 0, 0.6)
+            self.background = Rectangle(pos=self.pos, size=self.size)
 
-    for event_name in events_dict:
-        event_datetime = events_dict[event_name][2]
-        event_date = tuple(int(i) for i in reversed(event_datetime.split()[0].split("/")))
-        event_time = tuple(int(i) for i in event_datetime.split()[1].split(":"))
-        event_datetime = datetime(*(event_date + event_time))
+        self.bind(pos=self.update_background, size=self.update_background)
+        Window.bind(size=self.update_position)
+        self.update_position()
 
-        if event_datetime >= datetime.now().replace(second=0, microsecond=0):
-            filtered_events_dict[event_name] = events_dict[event_name]
+        Clock.schedule_interval(self.refresh, 0.5)
 
-    return filtered_events_dict
+    def update_background(self, *args):
+        self.background.pos = self.pos
+        self.background.size = self.size
+
+    # Keeps the overlay in the top left corner of the window
+    def update_position(self, *args):
+        self.pos = (dp(8), Window.height - self.height - dp(8))
+
+    def refresh(self, dt):
+        lines = ["{:<16}{:>6}{:>10}{:>10}{:>10}".format("ms", "n", "mean", "p95", "max")]
+
+        for name in self.shown:
+            statistics = profiler.statistics(name)
+
+            if statistics:
+                lines.append("{:<16}{:>6}{:>10.2f}{:>10.2f}{:>10.2f}".format(
+                    name, statistics["count"], 1000 * statistics["mean"], 1000 * statistics["p95"],
+                    1000 * statistics["max"]))
+
+        self.text = "\n".join(lines)
+        self.update_position()
 
 
 # An extension of the ScreenManager Kivy class to manage the three screens
@@ -146,13 +263,19 @@ class WindowsManager(ScreenManager):
     def __init__(self, **kwargs):
         super(WindowsManager, self).__init__(**kwargs)
 
-        global login_page  # Being global enables log out and home buttons to function
-        login_page = LoginPage(name="login")
+        # The three screens, each built the first time it is navigated to
+        self.screen_classes = {"starting": StartingPage, "login": LoginPage, "map": MapPage}
 
-        # Adding the three screens to the manager
         self.add_widget(StartingPage(name="starting"))
-        self.add_widget(login_page)
-        self.add_widget(MapPage(name="map"))
+
+    # Builds a screen the first time it is asked for
+    # ScreenManager looks up every screen it switches to through this method
+    def get_screen(self, name):
+        if name in self.screen_classes and not self.has_screen(name):
+            register_fonts()  # In case the screen is opened before the fonts are registered in the background
+            self.add_widget(self.screen_classes[name](name=name))
+
+        return super(WindowsManager, self).get_screen(name)
 
 
 # Starting page screen
@@ -347,6 +470,12 @@ class LoginPage(Screen):
 
         self.add_widget(self.layout)
 
+    # Initializes the login page with a hidden password field and empty fields whenever it is opened
+    def on_pre_enter(self, *args):
+        self.pressed_eye(forced=True)
+        self.released_eye()  # Simulating a press of the `eye` button`
+        self.reset_entries()
+
     # Manages the position of the `eye` icon whenever the screen is resized`
     def on_size(self, *args):
         self.button_eye.pos = (self.width / 2 + dp(300), self.height * 0.45 - dp(35))
@@ -387,7 +516,7 @@ class LoginPage(Screen):
         self.button_instructions.color = white
 
         # Instructions for defining a new username and password
-        multiline_instructions = Label(text='''
+        popup_pool.acquire("instructions").show('''
         Instructions for username :
 
         -  Minimum allowed length is 4 characters
@@ -400,14 +529,7 @@ class LoginPage(Screen):
         -  Minimum allowed length is 4
         -  Allowed characters : Alphanumeric (A-Z, a-z, 0-9) and symbols (@_$#*-)
         -  Maximum allowed length is 20 characters
-        ''',
-                                       font_name="FiraSans",
-                                       font_size=20)
-        instructions_popup = Popup(title="Instructions",
-                                   content=multiline_instructions,
-                                   size=(dp(750), dp(500)),
-                                   size_hint=(None, None))
-        instructions_popup.open()
+        ''')
 
     def validate_username(self, instance, value):
         # Real-time username validation
@@ -447,24 +569,34 @@ class LoginPage(Screen):
         elif len(password) < 4:
             self.show_error_message("Password must be at least 4 characters in length")
         else:
-            # Obtaining all usernames and their hashed passwords in a dictionary
-            with open("credentials.txt", 'r') as credentials_file:
-                credentials_dict = self.get_credentials_dict(credentials_file)
+            # Obtaining the hashed password of the username from the credentials cache, which may read the
+            # credentials database
+            self.show_loading(self.button_sign_in, "Signing in...")
+            io_executor.submit(lookup_credentials, username,
+                               on_done=partial(self.signed_in, username, password), on_error=self.credentials_error)
+
+    # Called with the hashed password of username once it has been looked up
+    def signed_in(self, username, password, password_hash):
+        self.hide_loading()
 
-            if username not in credentials_dict.keys():  # When the username doesn't exist
-                self.show_error_message("This username does not exist, please sign up")
+        # The user left the login page in the meantime
+        if self.manager.current != self.name:
+            return
 
-            elif credentials_dict[username] == hashlib.sha512(password.encode()).hexdigest():  # Successfully logged in
-                global current_username
-                current_username = username  # Updating the global variable
+        if password_hash is None:  # When the username doesn't exist
+            self.show_error_message("This username does not exist, please sign up")
 
-                self.manager.transition.direction = "left"
-                self.manager.current = "map"  # Go to map screen as an organiser
-                self.reset_entries()  # Reset input fields
-            else:
-                self.show_error_message(
-                    "Incorrect password, please try again")  # Username exists, but the passwords don't match
-                self.password_input.text = ""  # Emptying the password field
+        elif password_hash == hash_password(password):  # Successfully logged in
+            global current_username
+            current_username = username  # Updating the global variable
+
+            self.manager.transition.direction = "left"
+            self.manager.current = "map"  # Go to map screen as an organiser
+            self.reset_entries()  # Reset input fields
+        else:
+            self.show_error_message(
+                "Incorrect password, please try again")  # Username exists, but the passwords don't match
+            self.password_input.text = ""  # Emptying the password field
 
     def reset_entries(self):
         self.username_input.text = ""
@@ -482,9 +614,6 @@ class LoginPage(Screen):
         username = self.username_input.text
         password = self.password_input.text
 
-        # Obtaining all current credentials
-        with open("credentials.txt", "r") as credentials_file:
-            credentials_dict = self.get_credentials_dict(credentials_file)
         if len(username) < 4:
             self.show_error_message("Username must be at least 4 characters in length")
         elif len(username) > 20:
@@ -493,13 +622,22 @@ class LoginPage(Screen):
             self.show_error_message("Password must be no longer than 20 characters")
         elif len(password) < 4:
             self.show_error_message("Password must be at least 4 characters in length")
-        elif username in credentials_dict.keys():  # Username is already signed up
+        else:
+            # Add the new credentials to the database, unless the username is already signed up
+            self.show_loading(self.button_sign_up, "Signing up...")
+            io_executor.submit(credentials.register, username, hash_password(password),
+                               on_done=partial(self.signed_up, username), on_error=self.credentials_error)
+
+    # Called once the credentials database has been checked and written to
+    def signed_up(self, username, added):
+        self.hide_loading()
+
+        if not added:  # Username is already signed up
             self.show_error_message("This username is taken, please try again")
             self.reset_entries()
-        else:
-            with open("credentials.txt", "a") as credentials_file:  # Append new credentials in the database
-                credentials_file.write(username + ":" + hashlib.sha512(password.encode()).hexdigest() + "\n")
 
+        # The user stays signed up, but left the login page in the meantime
+        elif self.manager.current == self.name:
             global current_username
             current_username = username  # Update the global variable
 
@@ -507,33 +645,46 @@ class LoginPage(Screen):
             self.manager.current = "map"  # Go to map screen
             self.reset_entries()
 
-    def get_credentials_dict(self, file_object):
-        # Returns a dictionary after reading all credentials stored in file_object
-        sample_dict = {}
+    def credentials_error(self, error):
+        self.hide_loading()
+        self.show_error_message("The credentials could not be read, please try again")
 
-        for entry in file_object.readlines():
-            entry_split = entry.split(":")
-            sample_dict[entry_split[0]] = entry_split[1].strip()
+    # Shows that the credentials database is being used on button, and disables both buttons meanwhile
+    def show_loading(self, button, text):
+        button.text = text
+        self.button_sign_in.disabled = True
+        self.button_sign_up.disabled = True
 
-        return sample_dict
+    def hide_loading(self):
+        self.button_sign_in.text = "Sign in"
+        self.button_sign_up.text = "Sign up"
+        self.button_sign_in.disabled = False
+        self.button_sign_up.disabled = False
 
     # A generalized function to open a popup for various login-related error messages
     def show_error_message(self, error_message):
-        Popup(title="Error",
-              content=Label(text=error_message, font_name="FiraSans", font_size=23),
-              size_hint=(None, None),
-              size=(dp(700), dp(200))).open()
+        popup_pool.acquire("login_error").show(error_message)
 
 
 # Map screen
 class MapPage(Screen):
     def __init__(self, **kwargs):
         super(Screen, self).__init__(**kwargs)
-        self.add_widget(MapParent())
+        self.map_parent = MapParent()
+        self.add_widget(self.map_parent)
 
     def button_pressed(self, instance):
         self.manager.current = "login"
 
+    # The user logs in or out only while switching screens, so the back button is updated whenever the map is entered
+    def on_pre_enter(self, *args):
+        self.map_parent.update_back_button()
+        self.map_parent.search_trigger()  # Events may have been added or removed since the last search
+
+    # Resets the map size once the transition away from the map page is over, to make it seamless and smooth
+    def on_leave(self, *args):
+        self.map_parent.reset_params()
+
 
 # The layout for MapPage
 class MapParent(FloatLayout):
@@ -551,14 +702,92 @@ class MapParent(FloatLayout):
         self.add_widget(self.back_button)
         self.add_widget(self.map_screen)
 
+        # Searching events by the words of their names, descriptions and organisers, highlighting their landmarks
+        self.search_input = TextInput(multiline=False,
+                                      hint_text="Search events",
+                                      font_name="CamingoCode",
+                                      font_size=20,
+                                      pos_hint={"x": 0.02, "top": 0.98},
+                                      size=(dp(320), dp(44)),
+                                      size_hint=(None, None))
+
+        self.search_results = Label(font_name="OpenSans",
+                                    font_size=18,
+                                    color=white,
+                                    outline_color=black,
+                                    outline_width=2,
+                                    halign="left",
+                                    valign="top",
+                                    pos_hint={"x": 0.02, "top": 0.91},
+                                    size=(dp(320), dp(30)),
+                                    size_hint=(None, None))
+        self.search_results.bind(size=self.search_results.setter("text_size"))
+
+        self.add_widget(self.search_input)
+        self.add_widget(self.search_results)
+
+        # Searching only once typing pauses
+        self.search_trigger = Clock.create_trigger(self.search, 0.15)
+        self.search_input.bind(text=lambda *args: self.search_trigger())
+        self.indexing = False  # Whether the search index is being built
+
         # defining constants
         self.default_scale = self.map_screen.default_scale
         self.spring_effect = 0.1
+        self.bounds_tolerance = 0.5  # pixels by which the map may stay out of bounds once it has settled
+
+        # The spring-back function is run every 0.01 seconds, only while the map is out of the screen's bounds
+        self.spring_event = None
+        self.map_screen.bind(bbox=self.check_bounds)
+        Window.bind(size=self.check_bounds)
+
+        self.update_back_button()
+
+    def search(self, *args):
+        query = self.search_input.text
+
+        if not query.strip():
+            self.search_results.text = ""
+            self.map_screen.highlight_landmarks(set())
+            return
+
+        # The search index is only built on the first search, since it reads every description, which decodes the
+        # descriptions of the events loaded from a snapshot
+        if event_store.search_index is None:
+            self.search_results.text = "Searching..."
+            self.build_search_index()
+            return
+
+        with profiler.measure("search"):
+            matches = event_store.search(query)
+
+        venues = {event_store.events[event_name].venue for event_name in matches}
+        self.map_screen.highlight_landmarks(venues)
+
+        self.search_results.text = (str(len(matches)) + " event" + "s" * (len(matches) != 1) + " at " +
+                                    str(len(venues)) + " place" + "s" * (len(venues) != 1))
+
+    # Builds the search index in the background from a copy of the events, then searches again
+    def build_search_index(self):
+        if self.indexing:
+            return
+
+        self.indexing = True
+        events_snapshot = dict(event_store.events)
+        io_executor.submit(build_search_index, events_snapshot,
+                           on_done=partial(self.search_index_built, events_snapshot), on_error=self.search_index_failed)
+
+    def search_index_built(self, events_snapshot, search_index):
+        self.indexing = False
 
-        self.__initial_map_time = 0
+        # The index is brought up to date with the changes made to the events while it was built
+        event_store.attach_search_index(search_index, events_snapshot)
+        self.search_trigger()
 
-        # update function run every 0.01 seconds
-        Clock.schedule_interval(self.update, 0.01)
+    def search_index_failed(self, error):
+        self.indexing = False
+        self.search_results.text = "Search failed"
+        Logger.error("Search: The search index could not be built: " + repr(error))
 
     # For home/logout button
     def back_button_pressed(self, instance):
@@ -568,7 +797,31 @@ class MapParent(FloatLayout):
         global current_username
         current_username = ""  # Update the global variable to indicate a logout
 
-    def update(self, instance):
+    def update_back_button(self):
+        # Handling the back button's size based on the mode (visitor/organiser)
+        self.back_button.size = (([dp(60), dp(70)][bool(current_username)],) * 2)
+
+        # Handling the png for the home/logout button, based on whether the user is logged in or not
+        self.back_button.background_normal = "images/" + ["home", "logout"][bool(current_username)] + ".png"
+        self.back_button.background_down = "images/" + ["home", "logout"][bool(current_username)] + ".png"
+
+    def out_of_bounds(self):
+        return (self.map_screen.y > self.bounds_tolerance
+                or self.map_screen.x > self.bounds_tolerance
+                or self.map_screen.top < Window.height - self.bounds_tolerance
+                or self.map_screen.right < Window.width - self.bounds_tolerance)
+
+    # Called whenever the map is moved or resized, or the window is resized
+    def check_bounds(self, *args):
+        if self.spring_event is None and self.out_of_bounds():
+            self.spring_event = Clock.schedule_interval(self.spring_back, 0.01)
+
+    def spring_back(self, dt):
+        # Stops once the map has settled in the screen's bounds
+        if not self.out_of_bounds():
+            self.spring_event = None
+            return False
+
         # Keeping the map in the screen's bounds
         if self.map_screen.y > 0:
             self.map_screen.y -= self.map_screen.y * self.spring_effect
@@ -582,132 +835,97 @@ class MapParent(FloatLayout):
         if self.map_screen.right < Window.width:
             self.map_screen.right += (Window.width - self.map_screen.right) * self.spring_effect
 
-        # Handling the back button's size based on the mode (visitor/organiser)
-        self.back_button.size = (([dp(60), dp(70)][bool(current_username)],) * 2)
+    # Resetting the map to the default size
+    def reset_params(self):
+        self.map_screen.transform = Matrix().scale(self.default_scale, self.default_scale, self.default_scale)
 
-        # Handling the png for the home/logout button, based on whether the user is logged in or not
-        self.back_button.background_normal = "images/" + ["home", "logout"][bool(current_username)] + ".png"
-        self.back_button.background_down = "images/" + ["home", "logout"][bool(current_username)] + ".png"
 
-        # Stores the last time when the map page was active
-        if self.parent.manager.current == "map":
-            self.__initial_map_time = datetime.now()
+# Dialogs
+# Popups are reused through popup_pool, so that opening a dialog fills an existing widget tree with new content
+# instead of building a new one
 
-        # Resets the map size 0.5 seconds after switching from the map page to make the transition seamless and smooth
-        if self.parent.manager.current != "map" and type(self.__initial_map_time) is not int:
-            if (datetime.now() - self.__initial_map_time).total_seconds() >= 0.5:
-                self.reset_params()
+# Keeps the popups of each dialog type that are closed, and can be opened again
+class PopupPool:
+    def __init__(self):
+        self.builders = {}  # {<dialog type>: <function returning a new popup>}
+        self.free_popups = {}  # {<dialog type>: [<popup>, ...]}
 
-        if self.parent.manager.current == "starting":
-            login_page.pressed_eye(forced=True)  # Initializing login page with a hidden password field
-            login_page.released_eye()  # Simulating a press of the `eye` button`
-            login_page.reset_entries()  # Initializing the login page with empty fields
+    def register(self, dialog_type, builder):
+        self.builders[dialog_type] = builder
+        self.free_popups[dialog_type] = []
 
-    # Resetting the map to the default size
-    def reset_params(self):
-        self.map_screen.transform = Matrix().scale(self.default_scale, self.default_scale, self.default_scale)
+    # Returns a closed popup of dialog_type, building a new one only if all of them are open
+    def acquire(self, dialog_type):
+        if self.free_popups[dialog_type]:
+            return self.free_popups[dialog_type].pop()
 
+        popup = self.builders[dialog_type]()
+        popup.bind(parent=partial(self.popup_parent_changed, dialog_type))
 
-# Map Screen
-class MapScreen(ScatterLayout):
-    def __init__(self, **kwargs):
-        super(MapScreen, self).__init__(**kwargs, auto_bring_to_front=False, do_rotation=False)
+        return popup
 
-        # constants declaration
-        self.min_scale = 1.05
-        self.max_scale = 6
-        self.default_scale = 1.05
+    # A popup is removed from the window once its closing animation is over, and can be reused only then
+    def popup_parent_changed(self, dialog_type, popup, parent):
+        if parent is None:
+            self.free_popups[dialog_type].append(popup)
 
-        # map_image_width / map_image_height
-        # map image resolution is 10000 x 8800 pixels
-        self.image_aspect_ratio = 10 / 8.8
 
-        # default window aspect ratio in Kivy
-        self.old_default_aspect_ratio = 800 / 600
+# A popup displaying a message
+class MessageDialog(Popup):
+    def __init__(self, font_name, font_size, label_pos_hint=None, **kwargs):
+        super(MessageDialog, self).__init__(size_hint=(None, None), **kwargs)
 
-        self.scale_min = self.min_scale
-        self.scale_max = self.max_scale
+        self.message_label = Label(font_name=font_name, font_size=font_size, pos_hint=label_pos_hint or {})
+        self.content = self.message_label
 
-        # add the widgets
-        self.nila_map = Image(source="./images/nila_map.png",
-                              allow_stretch=False,
-                              keep_ratio=True
-                              )
-        self.add_widget(self.nila_map)
+    def show(self, message):
+        self.message_label.text = message
+        self.open()
 
-        # all the buttons for different landmarks
-        self.buttons_landmarks = {
-            location: Button(text=location,
-                             font_name="OpenSans",
-                             bold=True,
-                             font_size=18,
-                             color=white,
-                             outline_color=black,
-                             outline_width=4,
-                             size_hint=size_hints_dict[location],
-                             on_release=partial(self.location_button_pressed, location),
-                             background_color=transparent)
-            for location in relative_coordinates_dict}
-
-        self.buttons_landmarks["Tilang Parking"].text = "Tilang\nParking"
-
-        for landmark_button in self.buttons_landmarks.values():
-            self.add_widget(landmark_button)
 
-        self.transform = Matrix().scale(self.default_scale, self.default_scale, self.default_scale)
+# An event's description
+class DescriptionDialog(Popup):
+    def __init__(self, **kwargs):
+        super(DescriptionDialog, self).__init__(size=(dp(600), dp(420)), size_hint=(None, None), **kwargs)
 
-    def dominance(self):
-        if self.width >= self.image_aspect_ratio * self.height:
-            # Fits along height, i.e., the heights of Nila Map image and scatter layout are the same
-            return "height"
+        content_layout = FloatLayout(size=(dp(600), dp(390)), pos_hint={"x": 0, "y": 0}, size_hint=(None, None))
 
-        else:
-            # Fits along width, i.e., the widths of Nila Map image and scatter layout are the same
-            return "width"
+        self.description_label = Label(font_name="CamingoCode",
+                                       pos_hint={"x": 0, "top": 0.975},
+                                       size_hint=(1, 1),
+                                       text_size=(dp(550), None),
+                                       font_size=22)
 
-    def convert_pos_hint(self, image_hint_x, image_hint_y):
-        if self.dominance() == "height":
-            return 0.5 + ((image_hint_x - 0.5) * self.image_aspect_ratio * self.height / self.width), image_hint_y
-        else:
-            return image_hint_x, 0.5 + ((image_hint_y - 0.5) * self.width / (self.image_aspect_ratio * self.height))
+        content_layout.add_widget(self.description_label)
+        self.content = content_layout
 
-    def convert_size_hint(self, size_hint_x, size_hint_y):
-        if self.dominance() == "height":
-            return size_hint_x * self.old_default_aspect_ratio * (Window.height / Window.width), size_hint_y
-        else:
-            return size_hint_x, size_hint_y * (1 / self.old_default_aspect_ratio) * (Window.width / Window.height)
+    def show(self, event_name, event_description):
+        self.title = event_name + " - Description"
+        self.description_label.text = event_description
+        self.open()
 
-    # Manages the position and size of the buttons as the screen is resized
-    def on_size(self, *args):
-        for landmark in self.buttons_landmarks:
-            current_button = self.buttons_landmarks[landmark]
 
-            button_pos_hint = self.convert_pos_hint(relative_coordinates_dict[landmark][0],
-                                                    relative_coordinates_dict[landmark][1])
-            current_button.pos_hint = {"center_x": button_pos_hint[0], "center_y": button_pos_hint[1]}
+# A popup asking the organiser to confirm an action, which is carried out if "Yes" is pressed
+class ChoiceDialog(Popup):
+    def __init__(self, **kwargs):
+        super(ChoiceDialog, self).__init__(size_hint=(None, None), **kwargs)
+        self.yes_callback = None
 
-            button_size_hint = self.convert_size_hint(size_hints_dict[landmark][0], size_hints_dict[landmark][1])
-            current_button.size_hint = (button_size_hint[0], button_size_hint[1])
+    def show(self, yes_callback):
+        self.yes_callback = yes_callback
+        self.open()
 
-    # Zooming in and out using the scrollwheel
-    def on_touch_down(self, touch):
-        if touch.is_mouse_scrolling:
-            if touch.button == "scrolldown":
-                if self.scale < self.max_scale:
-                    self.scale *= 1.1
+    def yes_pressed(self, instance):
+        self.dismiss()
+        self.yes_callback()
 
-            if touch.button == "scrollup":
-                if self.scale > self.min_scale:
-                    self.scale *= 0.9
-        else:
-            super(MapScreen, self).on_touch_down(touch)
 
-    # Called when the remove button is pressed on an event
-    def remove_button_pressed(self, *args):
-        # Opens a confirmation popup about the event deletion
-        self.confirmation_popup = Popup(title="Confirmation", size=(dp(400), dp(200)), size_hint=(None, None))
+# Confirmation of an event's removal
+class ConfirmationDialog(ChoiceDialog):
+    def __init__(self, **kwargs):
+        super(ConfirmationDialog, self).__init__(title="Confirmation", size=(dp(400), dp(200)), **kwargs)
 
-        confirmation_layout = FloatLayout(size=self.confirmation_popup.size, size_hint=(None, None))
+        confirmation_layout = FloatLayout(size=self.size, size_hint=(None, None))
 
         confirmation_layout.add_widget(Label(text="Are you sure?",
                                              font_size=26,
@@ -722,7 +940,7 @@ class MapScreen(ScatterLayout):
                                               background_color=green,
                                               pos_hint={"center_x": 0.23, "center_y": 0.15},
                                               size_hint=(0.42, 0.27),
-                                              on_release=partial(self.remove_event, *args)
+                                              on_release=self.yes_pressed
                                               ))
 
         confirmation_layout.add_widget(Button(text="No",
@@ -731,33 +949,74 @@ class MapScreen(ScatterLayout):
                                               background_color=red,
                                               pos_hint={"center_x": 0.71, "center_y": 0.15},
                                               size_hint=(0.42, 0.27),
-                                              on_release=self.confirmation_popup.dismiss
+                                              on_release=self.dismiss
                                               ))
 
-        self.confirmation_popup.content = confirmation_layout
-        self.confirmation_popup.open()
+        self.content = confirmation_layout
 
-    # Called when the organiser confirms the deletion of an event
-    def remove_event(self, *args):
-        self.confirmation_popup.dismiss()
-        event_name = args[0]
-        current_location = args[1]
 
-        # Handling the events file
-        with open("events.txt", "r") as events_file:
-            data = events_file.read().split("\n")[:-1]
-        updated_events = "\n".join(entry for entry in data if entry.split("||")[0] != event_name)
+# Warns the organiser of a time clash, prompting them to ignore it or change the timings
+class TimeClashDialog(ChoiceDialog):
+    def __init__(self, **kwargs):
+        super(TimeClashDialog, self).__init__(title="Time clash", size=(dp(450), dp(250)), **kwargs)
 
-        with open("events.txt", "w") as events_file:
-            events_file.write(updated_events + "\n")
+        time_clash_layout = FloatLayout(size=(dp(400), dp(200)), size_hint=(None, None))
 
-        self.event_list_popup.dismiss()
-        self.location_button_pressed(current_location)
+        self.clash_label = Label(
+            font_name="OpenSans",
+            font_size=24,
+            halign="center",
+            pos_hint={"center_x": 0.5, "center_y": 0.67},
+            size_hint=(1, 0.5)
+        )
+        time_clash_layout.add_widget(self.clash_label)
+
+        time_clash_layout.add_widget(Button(
+            text="Yes",
+            font_name="CooperHewitt",
+            font_size=32,
+            background_color=light_green,
+            color=white,
+            pos_hint={"center_x": 0.28, "center_y": 0.18},
+            size_hint=(0.43, 0.3),
+            on_press=self.yes_pressed
+        ))
+        time_clash_layout.add_widget(Button(
+            text="No",
+            font_name="CooperHewitt",
+            font_size=32,
+            background_color=pastel_red,
+            color=white,
+            pos_hint={"center_x": 0.77, "center_y": 0.18},
+            size_hint=(0.43, 0.3),
+            on_press=self.dismiss
+        ))
+
+        self.content = time_clash_layout
+
+    # clashes is a dictionary of the conflicting events, sorted by their timing
+    def show(self, yes_callback, clashes=None):
+        clashes = clashes or {}
+        names = list(clashes)
+
+        if not names:
+            text = "Your event timing clashes with\nanother event.\nContinue?"
+        elif len(names) <= 2:
+            text = "Your event clashes with\n" + " and ".join(names) + "\nContinue?"
+        else:
+            text = "Your event clashes with\n" + names[0] + " and " + str(len(names) - 1) + " more\nContinue?"
 
-    # Called when the organiser initiates the addition of a new event
-    def add_new_event(self, *args):
-        # Opens a popup with the form to define a new event
-        self.new_event_popup = Popup(title="New Event in " + args[0], size=(dp(620), dp(550)), size_hint=(None, None))
+        self.clash_label.text = text
+        super(TimeClashDialog, self).show(yes_callback)
+
+
+# The form to define a new event
+class NewEventDialog(Popup):
+    def __init__(self, **kwargs):
+        super(NewEventDialog, self).__init__(size=(dp(620), dp(550)), size_hint=(None, None), **kwargs)
+
+        self.add_callback = None  # Called when the "Add" button is pressed
+        self.saving = False  # If the form has been submitted, and the new event is being saved
 
         self.popup_layout = FloatLayout(size=(dp(620), dp(550)), size_hint=(None, None))
 
@@ -810,31 +1069,50 @@ class MapScreen(ScatterLayout):
 
         self.popup_layout.add_widget(self.time_input)
 
+        self.popup_layout.add_widget(Label(text="Duration (optional)",
+                                           font_name="OpenSans",
+                                           bold=True,
+                                           font_size=24,
+                                           pos_hint={"center_x": 0.2, "center_y": 0.46}
+                                           ))
+
+        self.duration_input = TextInput(multiline=False,
+                                        font_size=24,
+                                        font_name="CamingoCode",
+                                        hint_text="HH:MM",
+                                        pos_hint={"x": 0.41, "center_y": 0.46},
+                                        size_hint=(0.54, 0.09)
+                                        )
+
+        self.popup_layout.add_widget(self.duration_input)
+
         self.popup_layout.add_widget(Label(text="Description",
                                            font_name="OpenSans",
                                            bold=True,
                                            font_size=24,
-                                           pos_hint={"center_x": 0.24, "center_y": 0.36}
+                                           pos_hint={"center_x": 0.24, "center_y": 0.29}
                                            ))
 
         self.description_input = TextInput(multiline=True,
                                            font_size=24,
                                            font_name="CamingoCode",
-                                           pos_hint={"x": 0.41, "center_y": 0.35},
-                                           size_hint=(0.54, 0.31)
+                                           pos_hint={"x": 0.41, "center_y": 0.28},
+                                           size_hint=(0.54, 0.2)
                                            )
 
         self.popup_layout.add_widget(self.description_input)
 
-        self.popup_layout.add_widget(Button(text="Add",
-                                            font_name="CooperHewitt",
-                                            font_size=30,
-                                            pos_hint={"center_x": 0.26, "center_y": 0.08},
-                                            size_hint=(0.38, 0.11),
-                                            background_color=green,
-                                            color=white,
-                                            on_release=partial(self.new_event_submission, *args)
-                                            ))
+        self.add_button = Button(text="Add",
+                                 font_name="CooperHewitt",
+                                 font_size=30,
+                                 pos_hint={"center_x": 0.26, "center_y": 0.08},
+                                 size_hint=(0.38, 0.11),
+                                 background_color=green,
+                                 color=white,
+                                 on_release=self.add_pressed
+                                 )
+
+        self.popup_layout.add_widget(self.add_button)
 
         self.popup_layout.add_widget(Button(text="Cancel",
                                             font_name="CooperHewitt",
@@ -843,145 +1121,47 @@ class MapScreen(ScatterLayout):
                                             size_hint=(0.38, 0.11),
                                             background_color=red,
                                             color=white,
-                                            on_release=self.new_event_popup.dismiss
+                                            on_release=self.dismiss
                                             ))
 
         # Binding each of the text inputs to their validation functions
         self.name_input.bind(text=self.validate_name_input)
         self.date_input.bind(text=self.validate_date_input)
         self.time_input.bind(text=self.validate_time_input)
+        self.duration_input.bind(text=self.validate_time_input)
         self.description_input.bind(text=self.validate_description_input)
 
-        self.new_event_popup.content = self.popup_layout
-        self.new_event_popup.open()
+        self.content = self.popup_layout
 
-    # A generalised function to open a popup for new event related errors
-    def error_popup(self, error_message):
-        Popup(title="Error",
-              content=Label(text=error_message,
-                            font_name="OpenSans",
-                            font_size=26,
-                            pos_hint={"x": 0, "y": 0.05}),
-              size=(dp(450), dp(250)),
-              size_hint=(None, None)).open()
+    # Clears the form and opens it for a new event at venue
+    def show(self, venue, add_callback):
+        self.title = "New Event in " + venue
+        self.add_callback = add_callback
 
-    # Called when the organiser initiates the request to add a new event
-    def new_event_submission(self, *args):
-        venue = args[0]
-        name = self.name_input.text
-        date = self.date_input.text
-        time = self.time_input.text
-        description = self.description_input.text
+        for text_input in (self.name_input, self.date_input, self.time_input, self.duration_input,
+                           self.description_input):
+            text_input.text = ""
 
-        # Obtaining the current events from the database and storing them in a dictionary
-        events_dict = obtain_events()
+        self.saving = False
+        self.add_button.text = "Add"
+        self.add_button.disabled = False
 
-        # Input Validation
-        if not (name and date and time and description):  # IF one of the fields is empty
-            self.error_popup("Please fill all entries")
+        self.open()
 
-        elif len(date) != 10:  # Invalid date length
-            self.error_popup("Invalid date")
-        else:
-            get_date, get_month, get_year = int(date[:2]), int(date[3:5]), int(date[6:])
-
-            days_in_month = [31, 28 + is_leap(get_year), 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
-
-            if get_month > 12 or get_date > days_in_month[get_month - 1]:  # Invalid date parameters
-                self.error_popup("Invalid date")
-            elif len(time) != 5:  # Invalid time length
-                self.error_popup("Invalid time")
-            else:
-                get_hours, get_minutes = int(time[:2]), int(time[3:])
-
-                if get_hours >= 24 or get_minutes >= 60:  # Invalid time parameters
-                    self.error_popup("Invalid time")
-                else:
-                    event_date = tuple(int(i) for i in reversed(date.split("/")))
-                    event_time = tuple(int(i) for i in time.split(":"))
-                    event_datetime = datetime(
-                        *(event_date + event_time))  # Converting the new event's timing to a datetime object
-
-                    if event_datetime < datetime.now().replace(second=0,
-                                                               microsecond=0):
-                        # If the new event's timing is before the current time
-                        self.error_popup("Event timing must be after\ncurrent timing")
-                    else:
-                        events_names = list(events_dict.keys())
-                        events_name_timing = {event_name: events_dict[event_name][2] for event_name in
-                                              events_dict}
-                        new_event_timing = date + " " + time
-
-                        # If the event name is already taken
-                        if name.strip() in events_names:
-                            self.error_popup("Event name is already taken")
-
-                        elif new_event_timing in events_name_timing.values():
-                            # Handling a timing clash
-                            # Opens a popup warning the organiser of a time clash,
-                            # prompting him to ignore it or change the timings
-                            self.time_clash_popup = Popup(title="Time clash",
-                                                          size=(dp(450), dp(250)),
-                                                          size_hint=(None, None))
-
-                            time_clash_layout = FloatLayout(size=(dp(400), dp(200)), size_hint=(None, None))
-                            time_clash_layout.add_widget(Label(
-                                text="Your event timing clashes with\nanother event.\nContinue?",
-                                font_name="OpenSans",
-                                font_size=24,
-                                pos_hint={"center_x": 0.5, "center_y": 0.67},
-                                size_hint=(1, 0.5)
-                            ))
+    def add_pressed(self, instance):
+        self.add_callback()
 
-                            time_clash_layout.add_widget(Button(
-                                text="Yes",
-                                font_name="CooperHewitt",
-                                font_size=32,
-                                background_color=light_green,
-                                color=white,
-                                pos_hint={"center_x": 0.28, "center_y": 0.18},
-                                size_hint=(0.43, 0.3),
-                                on_press=partial(self.add_event_manually, name + "||" + "|".join(
-                                    [venue, current_username, date + " " + time,
-                                     "\\n".join(description.split("\n"))]) + "\n", venue)
-                            ))
-                            time_clash_layout.add_widget(Button(
-                                text="No",
-                                font_name="CooperHewitt",
-                                font_size=32,
-                                background_color=pastel_red,
-                                color=white,
-                                pos_hint={"center_x": 0.77, "center_y": 0.18},
-                                size_hint=(0.43, 0.3),
-                                on_press=self.time_clash_popup.dismiss
-                            ))
-                            self.time_clash_popup.content = time_clash_layout
-                            self.time_clash_popup.open()
-
-                        # No exceptions encountered
-                        else:
-                            with open("events.txt", "a") as events_file:
-                                events_file.write(name + "||" + "|".join(
-                                    [venue, current_username, date + " " + time,
-                                     "\\n".join(description.split("\n"))]) + "\n")
-
-                            self.new_event_popup.dismiss()
-                            self.event_list_popup.dismiss()
-                            self.location_button_pressed(venue)
+    # Shows that the new event is being saved, and stops it from being submitted again
+    def show_saving(self):
+        self.saving = True
+        self.add_button.text = "Saving..."
+        self.add_button.disabled = True
 
-    # Called when the organiser decides to ignore the time clash
-    def add_event_manually(self, *args):
-        self.time_clash_popup.dismiss()
-        event_data = args[0]
-        venue = args[1]
-
-        # Writes the new event's data to the text file
-        with open("events.txt", "a") as events_file:
-            events_file.write(event_data)
-
-        self.new_event_popup.dismiss()
-        self.event_list_popup.dismiss()
-        self.location_button_pressed(venue)
+    # Closes the form once the new event has been saved
+    def saved(self):
+        if self.saving:
+            self.saving = False
+            self.dismiss()
 
     def validate_name_input(self, instance, value):
         # Real-time validation of the name input
@@ -1023,25 +1203,25 @@ class MapScreen(ScatterLayout):
             self.date_input.text = self.date_input.text[:10]
 
     def validate_time_input(self, instance, value):
-        # Real-time validation of the time input
+        # Real-time validation of the time and duration inputs
         # Doesn't allow any format other than HH : MM
-        current_length = len(self.time_input.text)
+        current_length = len(instance.text)
         digits = "0123456879"
 
         if current_length <= 2:
-            if self.time_input.text[-1:] not in digits:
-                self.time_input.text = self.time_input.text[:-1]
+            if instance.text[-1:] not in digits:
+                instance.text = instance.text[:-1]
 
         elif current_length == 3:
-            if self.time_input.text[-1] != ":":
-                self.time_input.text = self.time_input.text[:-1]
+            if instance.text[-1] != ":":
+                instance.text = instance.text[:-1]
 
         elif current_length <= 5:
-            if self.time_input.text[-1] not in digits:
-                self.time_input.text = self.time_input.text[:-1]
+            if instance.text[-1] not in digits:
+                instance.text = instance.text[:-1]
 
         else:
-            self.time_input.text = self.time_input.text[:-1]
+            instance.text = instance.text[:-1]
 
     def validate_description_input(self, instance, value):
         # Real-time validation of the description input
@@ -1053,189 +1233,951 @@ class MapScreen(ScatterLayout):
         while len(self.description_input.text.split()) > 100:
             self.description_input.text = self.description_input.text[:-1]
 
+
+# The list of events at a location
+class LocationDialog(Popup):
+    def __init__(self, **kwargs):
+        super(LocationDialog, self).__init__(size_hint=(None, None), size=(dp(550), dp(600)), **kwargs)
+
+        rows_layout = RecycleBoxLayout(orientation="vertical",
+                                       size_hint_y=None,
+                                       default_size_hint=(1, None))
+        rows_layout.bind(minimum_height=rows_layout.setter("height"))
+
+        self.event_list = RecycleView(key_viewclass="viewclass", do_scroll_x=False)
+        self.event_list.add_widget(rows_layout)
+        self.content = self.event_list
+
+        self.location_name = ""
+        self.pending_saves = 0  # Number of changes to the listed events still being saved
+
+    def show(self, location_name, rows_data):
+        self.title = location_name
+        self.location_name = location_name
+        self.pending_saves = 0
+        self.event_list.data = rows_data
+        self.event_list.scroll_y = 1  # Starting from the top of the list
+        self.open()
+
+    # Shows that a change to the listed events is being saved, until saved is called
+    def show_saving(self):
+        self.pending_saves += 1
+        self.title = self.location_name + " (saving...)"
+
+    def saved(self):
+        self.pending_saves = max(0, self.pending_saves - 1)
+
+        if not self.pending_saves:
+            self.title = self.location_name
+
+    # Removes the rows of the events named in removed, then inserts the rows of the events in inserted, a list of the
+    # rows of each event, at their sorted position, leaving the other rows as they are
+    # The rows are changed on a copy of the data, assigned once : the RecycleView can't lay out several changes made
+    # to its data in the same frame
+    def update_event_rows(self, removed=(), inserted=()):
+        removed = set(removed)
+        data = [row for row in self.event_list.data if row.get("event_name") not in removed]
+
+        for event_rows in inserted:
+            position = len(data)
+
+            for index, row in enumerate(data):
+                if row["viewclass"] == "EventRow" and row["sort_key"] > event_rows[0]["sort_key"]:
+                    position = index
+                    break
+
+            data[position:position] = event_rows
+
+        self.event_list.data = data
+
+    # Inserts the rows of a new event at their sorted position
+    def insert_event_rows(self, event_rows):
+        self.update_event_rows(inserted=[event_rows])
+
+    # Removes the rows of an event
+    def remove_event_rows(self, event_name):
+        self.update_event_rows(removed=[event_name])
+
+
+popup_pool = PopupPool()
+
+popup_pool.register("location", LocationDialog)
+popup_pool.register("description", DescriptionDialog)
+popup_pool.register("confirmation", ConfirmationDialog)
+popup_pool.register("time_clash", TimeClashDialog)
+popup_pool.register("new_event", NewEventDialog)
+popup_pool.register("error", lambda: MessageDialog(title="Error",
+                                                   font_name="OpenSans",
+                                                   font_size=26,
+                                                   label_pos_hint={"x": 0, "y": 0.05},
+                                                   size=(dp(450), dp(250))))
+popup_pool.register("login_error", lambda: MessageDialog(title="Error",
+                                                         font_name="FiraSans",
+                                                         font_size=23,
+                                                         size=(dp(700), dp(200))))
+popup_pool.register("instructions", lambda: MessageDialog(title="Instructions",
+                                                          font_name="FiraSans",
+                                                          font_size=20,
+                                                          size=(dp(750), dp(500))))
+
+
+# Rows of the location popup's event list
+# The RecycleView reuses each row's widgets for different events as the list is scrolled, so a row's content is set
+# through its properties, from the dictionaries in the RecycleView's data
+
+# The "Add New Event" button, shown to organisers
+class AddEventRow(FloatLayout):
+    map_screen = ObjectProperty(None)
+    location_name = StringProperty("")
+
+    def __init__(self, **kwargs):
+        super(AddEventRow, self).__init__(**kwargs)
+
+        self.add_widget(Button(text="Add New Event",
+                               font_name="CooperHewitt",
+                               font_size=26,
+                               pos_hint={"center_x": 0.5, "center_y": 0.4},
+                               size_hint=(0.55, 0.8),
+                               on_release=self.add_pressed,
+                               background_color=green,
+                               color=white
+                               ))
+
+    def add_pressed(self, instance):
+        self.map_screen.add_new_event(self.location_name)
+
+
+# An event's name, date and time, opening its description when clicked on
+class EventRow(FloatLayout):
+    map_screen = ObjectProperty(None)
+    event_name = StringProperty("")
+    event_timing = StringProperty("")
+    sort_key = ObjectProperty(None)  # Used to find the position of new events in the list
+
+    def __init__(self, **kwargs):
+        super(EventRow, self).__init__(**kwargs)
+
+        self.name_label = Label(font_name="OpenSans",
+                                bold=True,
+                                font_size=32,
+                                pos_hint={"center_x": 0.5, "center_y": 0.8},
+                                color=iitpkd_orange
+                                )
+
+        self.date_label = Label(font_name="OpenSans",
+                                bold=True,
+                                font_size=24,
+                                pos_hint={"center_x": 0.5, "center_y": 0.5},
+                                color=white
+                                )
+
+        self.time_label = Label(font_name="OpenSans",
+                                bold=True,
+                                font_size=24,
+                                pos_hint={"center_x": 0.5, "center_y": 0.26},
+                                color=white
+                                )
+
+        self.add_widget(self.name_label)
+        self.add_widget(self.date_label)
+        self.add_widget(self.time_label)
+        self.add_widget(Button(text="",
+                               pos_hint={"center_x": 0.5, "center_y": 0.5},
+                               background_color=transparent,
+                               on_press=self.description_pressed
+                               ))
+
+    def on_event_name(self, instance, value):
+        self.name_label.text = value
+
+    # The time is followed by the end of the event for events with a duration, which may have a date of its own
+    def on_event_timing(self, instance, value):
+        self.date_label.text, self.time_label.text = value.split(" ", 1)
+
+    def description_pressed(self, instance):
+        self.map_screen.open_event_description(self.event_name)
+
+
+# The "Remove above event" button, shown below the organiser's own events
+class RemoveEventRow(FloatLayout):
+    map_screen = ObjectProperty(None)
+    event_name = StringProperty("")
+    location_name = StringProperty("")
+
+    def __init__(self, **kwargs):
+        super(RemoveEventRow, self).__init__(**kwargs)
+
+        self.add_widget(Button(text="Remove above event",
+                               on_release=self.remove_pressed,
+                               font_size=24,
+                               font_name="CooperHewitt",
+                               pos_hint={"center_x": 0.5, "center_y": 0.5},
+                               background_color=red,
+                               color=white,
+                               size_hint=(0.5, 0.75)
+                               ))
+
+    def remove_pressed(self, instance):
+        self.map_screen.remove_button_pressed(self.event_name, self.location_name)
+
+
+# The RecycleView looks up the rows' classes by name
+Factory.register("AddEventRow", cls=AddEventRow)
+Factory.register("EventRow", cls=EventRow)
+Factory.register("RemoveEventRow", cls=RemoveEventRow)
+
+
+# Displays the Nila map from its tile pyramid, loading only the tiles that are visible at the current zoom level
+# The map is fit inside the widget keeping its aspect ratio, like an Image with keep_ratio=True
+class TiledMap(Widget):
+    def __init__(self, scatter, **kwargs):
+        super(TiledMap, self).__init__(**kwargs)
+
+        with open(os.path.join(tiles_directory, "pyramid.json"), "r") as pyramid_file:
+            pyramid = json.load(pyramid_file)
+
+        self.scatter = scatter  # The scatter layout in which the map is panned and zoomed
+        self.image_width = pyramid["width"]
+        self.image_height = pyramid["height"]
+        self.tile_size = pyramid["tile_size"]
+        self.levels = pyramid["levels"]  # [[<level width>, <level height>], ...], from the full-size image down
+
+        # Tiles loaded by Kivy's loader, from the least to the most recently used
+        self.tile_cache = OrderedDict()  # {(<level>, <column>, <row>): <loader image>}
+
+        # The coarsest level is a single tile, kept loaded and drawn under the other tiles while they load
+        self.background_texture = CoreImage(self.tile_path(len(self.levels) - 1, 0, 0)).texture
+
+        # Redraws at most once per frame, whenever the map is moved, zoomed or resized
+        self.redraw_trigger = Clock.create_trigger(self.redraw)
+        self.bind(pos=self.redraw_trigger, size=self.redraw_trigger)
+        self.scatter.bind(transform=self.redraw_trigger)
+        Window.bind(size=self.redraw_trigger)
+
+    def tile_path(self, level, column, row):
+        return os.path.join(tiles_directory, str(level), str(column) + "_" + str(row) + ".png")
+
+    # Returns the texture of a tile, or None while the tile is being loaded in the background
+    def get_tile(self, level, column, row):
+        key = (level, column, row)
+
+        if key in self.tile_cache:
+            self.tile_cache.move_to_end(key)
+        else:
+            tile_image = Loader.image(self.tile_path(level, column, row))
+            tile_image.bind(on_load=self.redraw_trigger)
+            self.tile_cache[key] = tile_image
+
+            if len(self.tile_cache) > tile_cache_size:
+                self.tile_cache.popitem(last=False)
+
+        tile_image = self.tile_cache[key]
+
+        return tile_image.texture if tile_image.loaded else None
+
+    def redraw(self, *args):
+        if self.width <= 1 or self.height <= 1:
+            return
+
+        # Size and position of the map, fit inside the widget
+        fit = min(self.width / self.image_width, self.height / self.image_height)
+        map_width, map_height = self.image_width * fit, self.image_height * fit
+        map_x = self.x + (self.width - map_width) / 2
+        map_top = self.y + (self.height + map_height) / 2
+
+        # The coarsest level that still has at least one pixel per pixel on the screen
+        screen_scale = fit * self.scatter.scale  # Pixels on the screen per pixel of the full-size image
+        level = 0 if screen_scale >= 1 else min(len(self.levels) - 1, int(math.log2(1 / screen_scale)))
+        level_width, level_height = self.levels[level]
+        tile_span = self.tile_size * map_width / level_width  # Size of a full tile, in this widget's coordinates
+
+        # The part of the map visible in the window, in this widget's coordinates
+        left, bottom = self.to_widget(0, 0)
+        right, top = self.to_widget(Window.width, Window.height)
+        left, right = min(left, right), max(left, right)
+        bottom, top = min(bottom, top), max(bottom, top)
+
+        columns = (level_width + self.tile_size - 1) // self.tile_size
+        rows = (level_height + self.tile_size - 1) // self.tile_size
+
+        first_column = max(0, int((left - map_x) // tile_span))
+        last_column = min(columns - 1, int((right - map_x) // tile_span))
+        first_row = max(0, int((map_top - top) // tile_span))
+        last_row = min(rows - 1, int((map_top - bottom) // tile_span))
+
+        self.canvas.clear()
+
+        with self.canvas:
+            Rectangle(texture=self.background_texture, pos=(map_x, map_top - map_height), size=(map_width, map_height))
+
+            for column in range(first_column, last_column + 1):
+                for row in range(first_row, last_row + 1):
+                    # Tiles on the right and bottom edges may be smaller than a full tile
+                    tile_width = min(self.tile_size, level_width - column * self.tile_size) * map_width / level_width
+                    tile_height = min(self.tile_size, level_height - row * self.tile_size) * map_width / level_width
+
+                    tile_texture = self.get_tile(level, column, row)
+
+                    # The background is left showing until the tile is loaded
+                    if tile_texture is not None:
+                        Rectangle(texture=tile_texture,
+                                  pos=(map_x + column * tile_span, map_top - row * tile_span - tile_height),
+                                  size=(tile_width, tile_height))
+
+
+# Map Screen
+# Renders many labels once and packs them into a few shared textures, the pages of the atlas
+# Every label can then be drawn as a quad of a Mesh using its page, so that any number of labels costs a few draw calls
+class LabelAtlas:
+    def __init__(self, labels):
+        # Format of labels : {<key>: <CoreLabel keyword arguments>}
+        self.regions = {}  # {<key>: (<page>, <u>, <v>, <u width>, <v height>, <width>, <height>)}
+        self.pages = []  # The framebuffers the labels are drawn into, whose textures are the pages
+
+        textures = {}
+        for key in labels:
+            label = CoreLabel(**labels[key])
+            label.refresh()
+            textures[key] = label.texture
+
+        positions, page_heights = pack_shelves([textures[key].size for key in textures], atlas_width, atlas_height)
+
+        for page_height in page_heights:
+            page = Fbo(size=(atlas_width, max(1, page_height)), with_stencilbuffer=False)
+
+            with page:
+                ClearColor(*transparent)
+                ClearBuffers()
+                Color(*white)
+
+            self.pages.append(page)
+
+        for key, (page, x, y) in zip(textures, positions):
+            width, height = textures[key].size
+            page_width, page_height = self.pages[page].size
+
+            self.pages[page].add(Rectangle(texture=textures[key], pos=(x, y), size=(width, height)))
+            self.regions[key] = (page, x / page_width, y / page_height, width / page_width, height / page_height,
+                                 width, height)
+
+        for page in self.pages:
+            page.draw()
+
+    def size(self, key):
+        return self.regions[key][5:]
+
+    def texture(self, page):
+        return self.pages[page].texture
+
+
+# Draws every landmark of the map with a few meshes : the backgrounds of the highlighted landmarks, the labels, and
+# badges with the number of upcoming events at every landmark
+# Landmarks have no widgets of their own, and taps on them are resolved by MapScreen through the landmark index
+class LandmarkLayer(Widget):
+    # Characters the badges are written with, each drawn from the atlas as a quad of its own
+    badge_characters = "0123456789+"
+
+    def __init__(self, landmark_index, **kwargs):
+        super(LandmarkLayer, self).__init__(**kwargs)
+
+        self.landmark_index = landmark_index
+        self.highlighted = set()  # Names of the highlighted landmarks
+        self.event_counts = {}  # {<landmark name>: <number of upcoming events>}, badges are drawn for non-zero counts
+
+        self.atlas = None  # Built on the first redraw, with the labels of all the landmarks and the badge characters
+
+        # The meshes are grouped by what they draw, and each group is rebuilt on its own
+        with self.canvas:
+            Color(*translucent_orange)
+            self.highlight_group = InstructionGroup()
+            Color(*white)
+            self.label_group = InstructionGroup()
+            Color(*orange_brown)
+            self.badge_group = InstructionGroup()
+            Color(*white)
+            self.badge_text_group = InstructionGroup()
+
+        # Layouts of the landmarks for the latest map rectangles, from the least to the most recently used
+        self.layout_cache = OrderedDict()  # {<map rectangle>: (<background rectangles>, <label positions>)}
+        self.drawn_rect = None  # The map rectangle the canvas is currently laid out for
+
+        # The labels keep their size in the map's coordinates, so the canvas only changes when the layer is resized
+        self.redraw_trigger = Clock.create_trigger(self.redraw)
+        self.bind(pos=self.redraw_trigger, size=self.redraw_trigger)
+
+    # Returns the position and size of the map image, fit inside the layer like the map itself
+    def map_rect(self):
+        if self.width >= map_aspect_ratio * self.height:
+            map_width, map_height = map_aspect_ratio * self.height, self.height
+        else:
+            map_width, map_height = self.width, self.width / map_aspect_ratio
+
+        return self.x + (self.width - map_width) / 2, self.y + (self.height - map_height) / 2, map_width, map_height
+
+    # Converts a point of the layer to a point of the map, as fractions of the map image's width and height
+    def map_point(self, x, y):
+        map_x, map_y, map_width, map_height = self.map_rect()
+        return (x - map_x) / map_width, (y - map_y) / map_height
+
+    def build_atlas(self):
+        labels = {}
+
+        for landmark in self.landmark_index.landmarks:
+            labels[("label", landmark.name)] = {"text": landmark.label, "font_name": "OpenSans", "bold": True,
+                                                "font_size": 18, "halign": "center", "outline_width": 4,
+                                                "outline_color": black[:3]}
+
+        for character in self.badge_characters:
+            labels[("badge", character)] = {"text": character, "font_name": "OpenSans", "bold": True, "font_size": 14}
+
+        self.atlas = LabelAtlas(labels)
+
+    # Replaces the meshes of group with meshes drawing quads, given as [(<page>, <rectangle>, <region>), ...]
+    # Quads without a page are drawn untextured
+    def fill_group(self, group, quads):
+        group.clear()
+
+        by_page = {}
+        for page, rectangle, region in quads:
+            by_page.setdefault(page, ([], []))
+            by_page[page][0].append(rectangle)
+            by_page[page][1].append(region)
+
+        for page, (rectangles, regions) in by_page.items():
+            texture = None if page is None else self.atlas.texture(page)
+
+            # The indices of a mesh are 16 bits wide, which limits how many quads a single mesh can draw
+            for first in range(0, len(rectangles), mesh_quads):
+                vertices, indices = quad_mesh(rectangles[first:first + mesh_quads], regions[first:first + mesh_quads])
+                group.add(Mesh(vertices=vertices, indices=indices, mode="triangles", texture=texture))
+
+    # Returns the rectangles of the landmarks' backgrounds and the positions of their labels for a map rectangle
+    def layout(self, map_rect):
+        if map_rect in self.layout_cache:
+            self.layout_cache.move_to_end(map_rect)
+            return self.layout_cache[map_rect]
+
+        label_sizes = [self.atlas.size(("label", landmark.name)) for landmark in self.landmark_index.landmarks]
+        background_rectangles, label_positions = self.landmark_index.layout(*map_rect, label_sizes)
+
+        self.layout_cache[map_rect] = background_rectangles, label_positions
+        if len(self.layout_cache) > landmark_layout_cache_size:
+            self.layout_cache.popitem(last=False)
+
+        return background_rectangles, label_positions
+
+    def redraw(self, *args):
+        map_rect = self.map_rect()
+
+        # Nothing has to move unless the map rectangle has changed
+        if map_rect == self.drawn_rect:
+            return
+
+        if self.atlas is None:
+            self.build_atlas()
+
+        self.drawn_rect = map_rect
+        background_rectangles, label_positions = self.layout(map_rect)
+
+        label_quads = []
+        for landmark, (x, y) in zip(self.landmark_index.landmarks, label_positions):
+            page, u, v, u_width, v_height, width, height = self.atlas.regions[("label", landmark.name)]
+            label_quads.append((page, [x, y, width, height], [u, v, u_width, v_height]))
+
+        self.fill_group(self.label_group, label_quads)
+        self.draw_highlights()
+        self.draw_badges()
+
+    def draw_highlights(self):
+        if self.drawn_rect is None:
+            return
+
+        background_rectangles = self.layout(self.drawn_rect)[0]
+
+        self.fill_group(self.highlight_group,
+                        [(None, rectangle, [0, 0, 0, 0])
+                         for landmark, rectangle in zip(self.landmark_index.landmarks, background_rectangles)
+                         if landmark.name in self.highlighted])
+
+    # Draws a badge in the top right corner of every landmark with upcoming events, with their number
+    def draw_badges(self):
+        if self.drawn_rect is None:
+            return
+
+        background_rectangles = self.layout(self.drawn_rect)[0]
+        badge_quads = []
+        text_quads = []
+
+        for landmark, (x, y, width, height) in zip(self.landmark_index.landmarks, background_rectangles):
+            count = self.event_counts.get(landmark.name, 0)
+            if not count:
+                continue
+
+            regions = [self.atlas.regions[("badge", character)] for character in (str(count) if count < 100 else "99+")]
+            text_width = sum(region[5] for region in regions)
+            text_height = max(region[6] for region in regions)
+
+            badge_width = max(text_width + text_height / 2, text_height)
+            badge_x, badge_y = x + width - badge_width, y + height - text_height
+            badge_quads.append((None, [badge_x, badge_y, badge_width, text_height], [0, 0, 0, 0]))
+
+            character_x = badge_x + (badge_width - text_width) / 2
+            for page, u, v, u_width, v_height, character_width, character_height in regions:
+                text_quads.append((page, [character_x, badge_y, character_width, character_height],
+                                   [u, v, u_width, v_height]))
+                character_x += character_width
+
+        self.fill_group(self.badge_group, badge_quads)
+        self.fill_group(self.badge_text_group, text_quads)
+
+    # Highlights the landmarks named in names, and restores the others
+    def highlight(self, names):
+        self.highlighted = set(names)
+        self.draw_highlights()
+
+    # Sets the numbers of upcoming events shown on the landmarks' badges
+    def show_event_counts(self, event_counts):
+        self.event_counts = event_counts
+        self.draw_badges()
+
+
+class MapScreen(ScatterLayout):
+    def __init__(self, **kwargs):
+        super(MapScreen, self).__init__(**kwargs, auto_bring_to_front=False, do_rotation=False)
+
+        # constants declaration
+        self.min_scale = 1.05
+        self.max_scale = 6
+        self.default_scale = 1.05
+
+        self.scale_min = self.min_scale
+        self.scale_max = self.max_scale
+
+        # The popups of the latest landmark tap and event addition
+        self.event_list_popup = None
+        self.new_event_popup = None
+
+        # add the widgets
+        # The tile pyramid from make_tiles.py is used when it exists, instead of uploading the full-size map image
+        # Otherwise, the full-size map image is decoded in the background
+        if os.path.exists(os.path.join(tiles_directory, "pyramid.json")):
+            self.nila_map = TiledMap(self)
+        else:
+            self.nila_map = AsyncImage(source=map_image_path,
+                                       allow_stretch=False,
+                                       keep_ratio=True
+                                       )
+        self.add_widget(self.nila_map)
+
+        # The landmarks are read from landmarks.json, and drawn by a single widget
+        self.landmark_index = LandmarkIndex(load_landmarks())
+        self.landmark_layer = LandmarkLayer(self.landmark_index)
+        self.add_widget(self.landmark_layer)
+
+        # The badges are counted again at most once per frame, however many events change
+        self.event_counts_trigger = Clock.create_trigger(self.update_event_counts)
+        self.update_event_counts()
+
+        self.transform = Matrix().scale(self.default_scale, self.default_scale, self.default_scale)
+
+    # Returns the landmark under pos, given in the parent's coordinates, or None
+    def landmark_at(self, pos):
+        return self.landmark_index.landmark_at(*self.landmark_layer.map_point(*self.to_local(*pos)))
+
+    # Shows the number of upcoming events at every landmark on its badge
+    def update_event_counts(self, *args):
+        self.landmark_layer.show_event_counts({landmark.name: len(event_store.venue_index.get(landmark.name, ()))
+                                               for landmark in self.landmark_index.landmarks})
+
+    # Zooming in and out using the scrollwheel
+    def on_touch_down(self, touch):
+        if touch.is_mouse_scrolling:
+            if touch.button == "scrolldown":
+                if self.scale < self.max_scale:
+                    self.scale *= 1.1
+
+            if touch.button == "scrollup":
+                if self.scale > self.min_scale:
+                    self.scale *= 0.9
+        else:
+            # A landmark is opened when a touch starting on it ends on it without having panned the map
+            if self.collide_point(*touch.pos):
+                landmark = self.landmark_at(touch.pos)
+
+                if landmark is not None:
+                    touch.ud["landmark_tap"] = (landmark, touch.pos)
+
+            super(MapScreen, self).on_touch_down(touch)
+
+    def on_touch_up(self, touch):
+        # The scatter also receives the touches it has grabbed, which are skipped here
+        if touch.grab_current is None and "landmark_tap" in touch.ud:
+            landmark, start_pos = touch.ud.pop("landmark_tap")
+
+            if math.dist(start_pos, touch.pos) <= tap_distance and self.landmark_at(touch.pos) is landmark:
+                self.location_button_pressed(landmark.name)
+
+        return super(MapScreen, self).on_touch_up(touch)
+
+    # Called when the remove button is pressed on an event
+    def remove_button_pressed(self, *args):
+        # Opens a confirmation popup about the event deletion
+        popup_pool.acquire("confirmation").show(partial(self.remove_event, *args))
+
+    # Called when the organiser confirms the deletion of an event
+    def remove_event(self, *args):
+        event_name = args[0]
+        current_location = args[1]
+
+        # Handling the events database, which is written to in the background
+        event_store.remove_event(event_name)
+        self.event_counts_trigger()
+
+        # Removing the event's rows from the open location popup, which shows that the removal is being saved
+        if self.event_list_popup.location_name == current_location:
+            self.event_list_popup.remove_event_rows(event_name)
+            self.event_list_popup.show_saving()
+            io_executor.after_pending(self.event_list_popup.saved)
+
+    # Called when the organiser initiates the addition of a new event
+    def add_new_event(self, *args):
+        # Opens a popup with the form to define a new event
+        self.new_event_popup = popup_pool.acquire("new_event")
+        self.new_event_popup.show(args[0], partial(self.new_event_submission, *args))
+
+    # A generalised function to open a popup for new event related errors
+    def error_popup(self, error_message):
+        popup_pool.acquire("error").show(error_message)
+
+    # Called when the organiser initiates the request to add a new event
+    @profiler.timed("submit")
+    def new_event_submission(self, *args):
+        venue = args[0]
+        name = self.new_event_popup.name_input.text
+        date = self.new_event_popup.date_input.text
+        time = self.new_event_popup.time_input.text
+        duration = self.new_event_popup.duration_input.text
+        description = self.new_event_popup.description_input.text
+
+        # Input Validation, shared with bulk imports (see event_io.py)
+        try:
+            new_event_record = validate_event(name, venue, current_username, date, time, duration, description)
+        except InvalidEvent as error:
+            self.error_popup(str(error))
+            return
+
+        new_event_data = new_event_record.entry()
+
+        # Events at the venue overlapping the new one
+        with profiler.measure("submit.clashes"):
+            clashes = event_store.clashes_at(venue, new_event_record.start, new_event_record.duration)
+
+        # If the event name is already taken
+        if name.strip() in event_store:
+            self.error_popup("Event name is already taken")
+
+        elif clashes:
+            # Handling a timing clash
+            # Opens a popup listing the clashing events, prompting the organiser to ignore them or change the timings
+            popup_pool.acquire("time_clash").show(partial(self.add_event_manually, name, new_event_data), clashes)
+
+        # No exceptions encountered
+        else:
+            self.add_event_manually(name, new_event_data)
+
+    # Called when the organiser decides to ignore the time clash
+    def add_event_manually(self, *args):
+        event_name = args[0]
+        event_data = args[1]
+        venue = event_data[0]
+
+        # Writes the new event's data to the events database, in the background
+        event_store.add_event(event_name, event_data)
+        expiry_timer.reschedule()
+        self.event_counts_trigger()
+
+        # The form stays open, showing that the event is being saved, until the write is done
+        self.new_event_popup.show_saving()
+        io_executor.after_pending(partial(self.event_saved, time.perf_counter()))
+
+        # Inserting the event's rows in the open location popup
+        if self.event_list_popup.location_name == venue:
+            self.event_list_popup.insert_event_rows(self.event_rows(event_name, event_store.get(event_name)))
+
+    # Called once a new event has been written to the events database
+    def event_saved(self, start):
+        if profiler.enabled:
+            profiler.record("submit.write", time.perf_counter() - start)
+
+        self.new_event_popup.saved()
+
     # Called whenever a landmark button is pressed
+    @profiler.timed("tap")
     def location_button_pressed(self, *args):
         location_name = args[0]
 
+        if profiler.enabled:
+            record_until_frame("tap.frame", time.perf_counter())
+
         # Handling the popup
-        # Format of events_dict : {<event name>:[<location name>,<organiser username>,<DD.MM.YY hh:mm>,<Description>]}
+        # Format of events_dict : {<event name>: <EventRecord>}
 
-        events_dict = obtain_events(location_name)
+        # Events at the venue that haven't ended, already sorted by their timing by the events store
+        with profiler.measure("tap.query"):
+            events_dict = event_store.timeline_at(location_name)
 
-        layout = GridLayout(cols=1, size_hint_y=None)  # The main layout inside the popup
-        layout.bind(minimum_height=layout.setter("height"))
+        with profiler.measure("tap.split"):
+            # User defined events (automatically handles the visitor/organiser modes)
+            events_by_user = {event: events_dict[event]
+                              for event in events_dict if events_dict[event].organiser == current_username}
 
-        # User defined events (automatically handles the visitor/organiser modes)
-        events_by_user = {event: events_dict[event]
-                          for event in events_dict if events_dict[event][1] == current_username}
+            # Events not defined by the user
+            events_not_by_user = {event: events_dict[event] for event in events_dict if event not in events_by_user}
 
-        # Events not defined by the user
-        events_not_by_user = {event: events_dict[event] for event in events_dict if event not in events_by_user}
+            # combined_events is the concatenation of events_by_user and events_not_by_user
+            combined_events = dict(events_by_user)
+            combined_events.update(events_not_by_user)
 
-        # Sorting each of the events dictionaries by the timing of the events
-        events_by_user = self.sort_events(events_by_user)
-        events_not_by_user = self.sort_events(events_not_by_user)
+        # Each row of the popup is described by a dictionary, and only the visible rows get widgets, which are reused
+        # as the list is scrolled
+        with profiler.measure("tap.rows"):
+            rows_data = []
 
-        # combined_events is the concatenation of events_by_user and events_not_by_user
-        combined_events = dict(events_by_user)
-        combined_events.update(events_not_by_user)
-        combined_events = filter_events(combined_events)
+            # "Add events" option for organisers
+            if current_username:
+                rows_data.append({"viewclass": "AddEventRow", "height": dp(80),
+                                  "map_screen": self, "location_name": location_name})
 
-        add_events_button_layout = FloatLayout(size=(dp(550), dp(80)), size_hint=(None, None))
+            # Displays each event and gives options for their management
+            for event_name in combined_events:
+                rows_data.extend(self.event_rows(event_name, combined_events[event_name]))
 
-        add_events_button_layout.add_widget(Button(text="Add New Event",
-                                                   font_name="CooperHewitt",
-                                                   font_size=26,
-                                                   pos_hint={"center_x": 0.5, "center_y": 0.4},
-                                                   size_hint=(0.55, 0.8),
-                                                   on_release=partial(self.add_new_event, location_name),
-                                                   background_color=green,
-                                                   color=white
-                                                   ))
-
-        # "Add events" option for organisers
-        if current_username:
-            layout.add_widget(add_events_button_layout)
-
-        # Displays each event and gives options for their management
-        for event_name in combined_events:
-            event_data = combined_events[event_name]
-            event_date, event_time = event_data[2].split()
-            event_description = event_data[3]
-
-            event_info_layout = FloatLayout(size=(dp(550), dp(160)), size_hint=(None, None))
-            event_info_layout.add_widget(Label(text=event_name,
-                                               font_name="OpenSans",
-                                               bold=True,
-                                               font_size=32,
-                                               pos_hint={"center_x": 0.5, "center_y": 0.8},
-                                               color=iitpkd_orange
-                                               ))
-
-            event_info_layout.add_widget(Label(text=event_date,
-                                               font_name="OpenSans",
-                                               bold=True,
-                                               font_size=24,
-                                               pos_hint={"center_x": 0.5, "center_y": 0.5},
-                                               color=white
-                                               ))
-
-            event_info_layout.add_widget(Label(text=event_time,
-                                               font_name="OpenSans",
-                                               bold=True,
-                                               font_size=24,
-                                               pos_hint={"center_x": 0.5, "center_y": 0.26},
-                                               color=white
-                                               ))
-
-            event_info_layout.add_widget(Button(text="",
-                                                pos_hint={"center_x": 0.5, "center_y": 0.5},
-                                                size=event_info_layout.size,
-                                                size_hint=(None, None),
-                                                background_color=transparent,
-                                                on_press=partial(self.open_event_description, event_name,
-                                                                 event_description)
-                                                ))
-
-            layout.add_widget(event_info_layout)
-
-            if event_name in events_by_user:
-                remove_button_layout = FloatLayout(size=(dp(550), dp(80)), size_hint=(None, None))
-                remove_event_button = Button(text="Remove above event",
-                                             on_release=partial(self.remove_button_pressed, event_name, location_name),
-                                             font_size=24,
-                                             font_name="CooperHewitt",
-                                             pos_hint={"center_x": 0.5, "center_y": 0.5},
-                                             background_color=red,
-                                             color=white,
-                                             size_hint=(0.5, 0.75)
-                                             )
-                remove_button_layout.add_widget(remove_event_button)
-                layout.add_widget(remove_button_layout)
-
-        scroll = ScrollView()
-        scroll.add_widget(layout)
-
-        self.event_list_popup = Popup(title=location_name,
-                                      content=scroll,
-                                      size_hint=(None, None),
-                                      size=(dp(550), dp(600)))
-        self.event_list_popup.open()
+        with profiler.measure("tap.popup"):
+            self.event_list_popup = popup_pool.acquire("location")
+            self.event_list_popup.show(location_name, rows_data)
+
+    # Highlights the landmarks of venues, and restores the others
+    def highlight_landmarks(self, venues):
+        self.landmark_layer.highlight(venues)
+
+    # Called with the events that have just ended, to take them off the open location popup
+    def events_ended(self, ended):
+        self.event_counts_trigger()
+
+        if self.event_list_popup is None:
+            return
+
+        for event_name in ended:
+            if ended[event_name].venue == self.event_list_popup.location_name:
+                self.event_list_popup.remove_event_rows(event_name)
+
+    # Called with the events changed by other instances of the application, and their records before the changes, to
+    # update the open location popup
+    def events_changed(self, changed):
+        self.event_counts_trigger()
+
+        if self.event_list_popup is None:
+            return
+
+        location_name = self.event_list_popup.location_name
+        removed = []
+        inserted = []
+
+        for event_name, previous in changed.items():
+            current = event_store.get(event_name)
+
+            if previous is not None and previous.venue == location_name:
+                removed.append(event_name)
+
+            if current is not None and current.venue == location_name:
+                inserted.append(self.event_rows(event_name, current))
+
+        # All the changes are made to the rows at once
+        if removed or inserted:
+            self.event_list_popup.update_event_rows(removed, inserted)
+
+    # Returns the rows of the location popup for an event, given as its EventRecord, with a remove button for the
+    # organiser's own events
+    def event_rows(self, event_name, event_data):
+        by_user = event_data.organiser == current_username
+
+        # Shows the end of the event after its timing, for events with a duration
+        event_timing = event_data.timing
+        duration = event_data.duration
+
+        if duration:
+            event_end = initial_datetime + timedelta(minutes=event_data.start + duration)
+            event_timing += " - " + event_end.strftime("%H:%M" if duration < 24 * 60 else "%d/%m/%Y %H:%M")
+
+        # The organiser's events are listed first, and both groups are sorted by their timing
+        rows = [{"viewclass": "EventRow", "height": dp(160), "map_screen": self,
+                 "event_name": event_name, "event_timing": event_timing,
+                 "sort_key": (not by_user, event_store.time_keys[event_name])}]
+
+        if by_user:
+            rows.append({"viewclass": "RemoveEventRow", "height": dp(80), "map_screen": self,
+                         "event_name": event_name, "location_name": event_data.venue})
+
+        return rows
 
     # Called when an event's name is clicked on. Opens the event's description
+    # Descriptions are only read from the events store here, since those loaded from a snapshot are decoded on demand
     def open_event_description(self, *args):
         event_name = args[0]
-        event_description = "\n".join(args[1].split("\\n"))
-        content_layout = FloatLayout(size=(dp(600), dp(390)), pos_hint={"x": 0, "y": 0}, size_hint=(None, None))
+        event_data = event_store.get(event_name)
 
-        self.description_label = Label(text=event_description,
-                                       font_name="CamingoCode",
-                                       pos_hint={"x": 0, "top": 0.975},
-                                       size_hint=(1, 1),
-                                       text_size=(dp(550), None),
-                                       font_size=22)
+        # The event may have ended since its row was shown
+        if event_data is None:
+            return
 
-        content_layout.add_widget(self.description_label)
+        event_description = "\n".join(event_data.description.split("\\n"))
 
-        Popup(title=event_name + " - Description",
-              size=(dp(600), dp(420)),
-              size_hint=(None, None),
-              content=content_layout
-              ).open()
+        popup_pool.acquire("description").show(event_name, event_description)
 
-    # Sorts events based on their timing
-    def sort_events(self, events_dict):
-        if len(events_dict) == 0:
-            return events_dict
 
-        # Handling non-empty inputs
-        initial_datetime = datetime(1970, 1, 1)
-        events_list = []
+# Removes events from the events store as they end, with a single Clock timer set for when the next event ends
+class ExpiryTimer:
+    # The timer is set again at least this often, in seconds, in case the system clock is changed
+    longest_wait = 3600
 
-        # Format of events_list = [event_name, number of seconds elapsed from 1 January, 1970 to the event's time]
-        for event_name in events_dict:
-            event_timing = events_dict[event_name][2]
-            event_date, event_time = event_timing.split()
+    # The removals of ended events are written to the events database once this many are pending
+    write_batch = 50
 
-            event_datetime = datetime(*(tuple(int(i) for i in reversed(event_date.split("/"))) + tuple(
-                int(i) for i in event_time.split(":"))))
+    def __init__(self):
+        self.timer = None
 
-            events_list.append([event_name, (event_datetime - initial_datetime).total_seconds()])
+    # Sets the timer for the next event to end, replacing the current one
+    def reschedule(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
 
-        events_list.sort(key=comparison_function)
-        output_dict = {event[0]: events_dict[event[0]] for event in events_list}
+        deadline = event_store.next_deadline()
+        if deadline is None:
+            return
 
-        return output_dict
+        wait = (initial_datetime + timedelta(minutes=deadline) - datetime.now()).total_seconds()
+        self.timer = Clock.schedule_once(self.expire, min(max(wait, 0), self.longest_wait))
 
+    def expire(self, dt):
+        self.timer = None
+        ended = event_store.expire()
 
-# Removes those events from the events file that have already ended
-def update_events_file():
-    events_dict = obtain_events() # Obtaining the current events in the form of a dictionary
+        if ended:
+            map_screen = built_map_screen()
+            if map_screen is not None:
+                map_screen.events_ended(ended)
+
+            # Ended events are removed again whenever the events database is read, so their removal is written lazily
+            if len(event_store.expired) >= self.write_batch:
+                event_store.write_expired()
+
+        self.reschedule()
 
-    new_events_dict = {}
 
-    for event_name in events_dict:
-        event_timing = events_dict[event_name][2]
-        event_date = tuple(int(i) for i in reversed(event_timing.split(" ")[0].split("/")))
-        event_time = tuple(int(i) for i in event_timing.split(" ")[1].split(":"))
-        event_datetime = datetime(*(event_date + event_time))
+expiry_timer = ExpiryTimer()
 
-        if event_datetime >= datetime.now().replace(second=0, microsecond=0):
-            new_events_dict[event_name] = events_dict[event_name]
 
-    to_write = [event_name + "||" + "|".join(new_events_dict[event_name]) + "\n" for event_name in new_events_dict]
+# Picks up the changes made to the events by other instances of the application sharing the storage
+# Every check is a single stat of the events file on the I/O thread, and only the records appended since the last
+# check are read
+class ChangeWatcher:
+    # Seconds between checks
+    interval = 2
 
-    with open("events.txt", "w") as new_events_file:
-        for entry in to_write:
-            new_events_file.write(entry)
+    def __init__(self):
+        self.checking = False
+        self.event = None  # The Clock event of the checks, while they are scheduled
+
+    def start(self):
+        if self.event is None:
+            self.event = Clock.schedule_interval(self.check, self.interval)
+
+    def stop(self):
+        if self.event is not None:
+            self.event.cancel()
+            self.event = None
+
+    def check(self, dt):
+        # The changes are read back by a load in progress anyway
+        if self.checking or event_store.loading:
+            return
+
+        self.checking = True
+        io_executor.submit(storage.read_changes, on_done=self.changes_read, on_error=self.read_failed)
+
+    def changes_read(self, result):
+        self.checking = False
+
+        # A load started since the check reads the changes itself
+        if result is None or event_store.loading:
+            return
+
+        changes, position = result
+        changed = event_store.apply_changes(changes)
+        storage.changes_applied(position)
+
+        if changed:
+            expiry_timer.reschedule()
+
+            map_screen = built_map_screen()
+            if map_screen is not None:
+                map_screen.events_changed(changed)
+
+    def read_failed(self, error):
+        self.checking = False
+
+        if isinstance(error, ReloadNeeded):
+            load_events()
+
+
+change_watcher = ChangeWatcher()
+
+
+# Removes those events from the events file that have already ended
+# The removals are appended to the events log in a single write
+def update_events_file():
+    event_store.prune()
 
 
 # The class that manages the entire application
 class EventMapperApp(App):
     def build(self):
+        register_fonts(starting_page_fonts)
+        Window.bind(on_flip=self.load_assets)
+
+        # The events are loaded in the background, then removed as they end while the application runs, and kept up to
+        # date with the other instances sharing the storage
+        load_events()
+        change_watcher.start()
+
+        if profiler.enabled:
+            # Frame times, as the time between consecutive frames
+            Clock.schedule_interval(lambda dt: profiler.record("frame", dt), 0)
+            register_fonts(["CamingoCode"])
+            Window.add_widget(ProfilerOverlay())
+
         return WindowsManager()
 
+    def on_stop(self):
+        # Writing the pending removals of ended events, and waiting for the writes still in progress
+        event_store.write_expired()
+        io_executor.shutdown()
+
+        if profiler.enabled:
+            Logger.info("Profiling: samples written to " + profiler.dump())
+
+    # Called once the first frame is displayed, to load the assets of the other screens while the starting page is shown
+    def load_assets(self, *args):
+        Window.unbind(on_flip=self.load_assets)
+
+        register_fonts()
+
+        # The full-size map is decoded by Kivy's loader in the background, and cached for the map page
+        # The tile pyramid needs no preloading, since only the visible tiles are ever loaded
+        if not os.path.exists(os.path.join(tiles_directory, "pyramid.json")):
+            Loader.image(map_image_path)
+
 
 if __name__ == "__main__":
-    update_events_file()  # Filter out the events that have already ended
     EventMapperApp().run()
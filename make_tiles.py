@@ -0,0 +1,58 @@
+# Generates the tile pyramid of the Nila map, used by the map page instead of the full-size image
+# Needs Pillow, and is run once whenever images/nila_map.png changes :
+#     python make_tiles.py
+
+import json
+import os
+import sys
+
+from PIL import Image
+
+source_path = "images/nila_map.png"
+tiles_directory = "images/tiles"
+tile_size = 512
+
+# Format of pyramid.json : {"width": <source width>, "height": <source height>, "tile_size": <tile size>,
+#                           "levels": [[<level width>, <level height>], ...]}
+# Level 0 is the full-size image, and every following level is half the size of the previous one
+# The tile in column c and row r (counted from the top left) of level l is stored at <tiles directory>/<l>/<c>_<r>.png
+
+
+def make_tiles(source=source_path, directory=tiles_directory):
+    Image.MAX_IMAGE_PIXELS = None  # The source image is larger than Pillow's decompression bomb limit
+
+    level_image = Image.open(source)
+    level_image.load()
+    width, height = level_image.size
+
+    levels = []
+
+    while True:
+        level = len(levels)
+        level_width, level_height = level_image.size
+        levels.append([level_width, level_height])
+
+        level_directory = os.path.join(directory, str(level))
+        os.makedirs(level_directory, exist_ok=True)
+
+        for column in range(0, (level_width + tile_size - 1) // tile_size):
+            for row in range(0, (level_height + tile_size - 1) // tile_size):
+                box = (column * tile_size, row * tile_size,
+                       min((column + 1) * tile_size, level_width), min((row + 1) * tile_size, level_height))
+                level_image.crop(box).save(os.path.join(level_directory, str(column) + "_" + str(row) + ".png"),
+                                           optimize=True)
+
+        # The last level fits in a single tile
+        if level_width <= tile_size and level_height <= tile_size:
+            break
+
+        level_image = level_image.resize((max(1, level_width // 2), max(1, level_height // 2)), Image.LANCZOS)
+
+    with open(os.path.join(directory, "pyramid.json"), "w") as pyramid_file:
+        json.dump({"width": width, "height": height, "tile_size": tile_size, "levels": levels}, pyramid_file)
+
+    return levels
+
+
+if __name__ == "__main__":
+    make_tiles(*sys.argv[1:3])
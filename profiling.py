@@ -0,0 +1,119 @@
+# Opt-in timing of the application's hot paths, kept free of Kivy so that it can be used headless
+# Profiling is turned on by the EVENT_MAPPER_PROFILE environment variable, or the --profile command line flag :
+#     EVENT_MAPPER_PROFILE=1 python main.py
+#     python main.py --profile=kiosk.csv
+# The samples are written to the given file when the application stops, as CSV if its name ends with .csv and as
+# JSON otherwise ("1" and a bare --profile use default_dump_path)
+
+import csv
+import json
+import os
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+default_dump_path = "profile.json"
+
+# Number of recent samples kept per measurement for the rolling statistics, and in total for the dump
+window_size = 200
+history_size = 20000
+
+null_measurement = nullcontext()
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self.dump_path = None
+
+        self.samples = {}  # {<measurement name>: deque of the most recent durations, in seconds}
+        self.history = deque(maxlen=history_size)  # [(<seconds since the epoch>, <measurement name>, <duration>), ...]
+
+    def enable(self, dump_path=default_dump_path):
+        self.enabled = True
+        self.dump_path = dump_path
+
+    def record(self, name, duration):
+        if name not in self.samples:
+            self.samples[name] = deque(maxlen=window_size)
+
+        self.samples[name].append(duration)
+        self.history.append((time.time(), name, duration))
+
+    # Times the body of a with statement under name
+    # The disabled profiler returns a shared no-op context, so that measuring costs almost nothing by default
+    def measure(self, name):
+        if not self.enabled:
+            return null_measurement
+
+        return self.measuring(name)
+
+    @contextmanager
+    def measuring(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    # Decorator timing every call of a function under name
+    def timed(self, name):
+        def decorator(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.measure(name):
+                    return function(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    # Returns the statistics of the recent samples of a measurement, or None if it has no samples
+    def statistics(self, name):
+        samples = self.samples.get(name)
+        if not samples:
+            return None
+
+        ordered = sorted(samples)
+        return {"count": len(ordered),
+                "mean": sum(ordered) / len(ordered),
+                "p50": ordered[len(ordered) // 2],
+                "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+                "max": ordered[-1]}
+
+    # Writes every recorded sample, and the rolling statistics of every measurement when writing JSON
+    def dump(self, path=None):
+        path = path or self.dump_path or default_dump_path
+
+        if path.endswith(".csv"):
+            with open(path, "w", newline="") as dump_file:
+                writer = csv.writer(dump_file)
+                writer.writerow(["time", "name", "seconds"])
+                writer.writerows(self.history)
+        else:
+            with open(path, "w") as dump_file:
+                json.dump({"statistics": {name: self.statistics(name) for name in self.samples},
+                           "samples": [{"time": sample_time, "name": name, "seconds": duration}
+                                       for sample_time, name, duration in self.history]},
+                          dump_file, indent=2)
+
+        return path
+
+
+# The profiler shared by the whole application
+profiler = Profiler()
+
+
+# Turns the profiler on if asked to by the environment or the command line
+# The --profile flag is removed from argv, so that it must be called before Kivy parses the command line
+def configure(argv):
+    dump_path = os.environ.get("EVENT_MAPPER_PROFILE")
+
+    for argument in list(argv[1:]):
+        if argument == "--profile" or argument.startswith("--profile="):
+            argv.remove(argument)
+            dump_path = argument.partition("=")[2] or "1"
+
+    if dump_path:
+        profiler.enable(default_dump_path if dump_path == "1" else dump_path)
@@ -0,0 +1,103 @@
+# Inverted index over the words of the events' names, descriptions and organisers, for searching events by prefix
+
+import re
+from bisect import bisect_left, insort
+
+word_pattern = re.compile(r"\w+")
+
+# A word of a query matching at most this many indexed words is checked by looking events up in their postings
+few_postings = 16
+
+
+# Returns the set of lowercase words in text
+# Descriptions are stored with their line breaks escaped as "\n", which must not be joined to the next word
+def words_in(text):
+    return set(word_pattern.findall(text.replace("\\n", " ").lower()))
+
+
+# Returns the words of an event, given as an EventRecord, that it can be found by
+def event_words(event_name, event_data):
+    return words_in(event_name) | words_in(event_data.description) | words_in(event_data.organiser)
+
+
+class SearchIndex:
+    def __init__(self):
+        self.postings = {}  # {<word>: {<event name>, ...}}
+        self.words = []  # All the indexed words, sorted, for finding the words starting with a prefix
+        self.event_words = {}  # {<event name>: <set of its words>}, for removing events
+
+    def add(self, event_name, event_data):
+        words = event_words(event_name, event_data)
+        self.event_words[event_name] = words
+
+        for word in words:
+            if word not in self.postings:
+                self.postings[word] = set()
+                insort(self.words, word)
+
+            self.postings[word].add(event_name)
+
+    # Indexes many events at once, sorting the new words only once
+    def add_many(self, events):
+        new_words = []
+
+        for event_name in events:
+            words = event_words(event_name, events[event_name])
+            self.event_words[event_name] = words
+
+            for word in words:
+                posting = self.postings.get(word)
+
+                if posting is None:
+                    self.postings[word] = {event_name}
+                    new_words.append(word)
+                else:
+                    posting.add(event_name)
+
+        self.words = sorted(self.words + new_words)
+
+    def remove(self, event_name):
+        for word in self.event_words.pop(event_name, ()):
+            posting = self.postings[word]
+            posting.discard(event_name)
+
+            # Words are dropped with their last event, so that prefixes only ever match words of live events
+            if not posting:
+                del self.postings[word]
+                del self.words[bisect_left(self.words, word)]
+
+    # Returns the words starting with prefix
+    def words_with_prefix(self, prefix):
+        start = bisect_left(self.words, prefix)
+        end = bisect_left(self.words, prefix + "\U0010ffff")
+
+        return self.words[start:end]
+
+    # Returns the set of names of the events that have, for every word of query, a word starting with it
+    def search(self, query):
+        # Each word of the query is matched by the union of the postings of the indexed words starting with it
+        terms = []
+
+        for term in words_in(query):
+            postings = [self.postings[word] for word in self.words_with_prefix(term)]
+            terms.append((sum(len(posting) for posting in postings), term, postings))
+
+        if not terms:
+            return set()
+
+        # Starting from the word matching the fewest events, and only narrowing those events down from then on
+        terms.sort(key=lambda matched_term: matched_term[0])
+        matches = set().union(*terms[0][2])
+
+        for matched_events, term, postings in terms[1:]:
+            if not matches:
+                break
+
+            # A few postings are cheaper to look the events up in than the events' own words are to go through
+            if len(postings) <= few_postings:
+                matches = {event_name for event_name in matches if any(event_name in posting for posting in postings)}
+            else:
+                matches = {event_name for event_name in matches
+                           if any(word.startswith(term) for word in self.event_words[event_name])}
+
+        return matches
@@ -0,0 +1,274 @@
+# Headless read-only HTTP/JSON server for the events, for signage screens and phones to poll a single process
+# It uses asyncio from the Standard Library and never imports Kivy, so it runs without a display :
+#     python main.py --serve
+#     python server.py --host 127.0.0.1 --port 8080
+# The events are read from the storage selected like the application's (see storage.open_storage), and kept up to
+# date with the changes the kiosks write, which are picked up like the application does (see Storage.read_changes)
+#
+# Every response is JSON, with an ETag, and a request with a matching If-None-Match gets an empty 304 response
+# Responses are cached until the events change, and those that depend on the current time until the next minute
+#     GET /venues                        - [{"venue": <location name>, "events": <number of events>}, ...]
+#     GET /events                        - all the events that haven't ended, sorted by their timing
+#     GET /upcoming                      - the events starting from now, sorted by their timing
+#     GET /venues/<venue>/events         - the events at a venue that haven't ended, sorted by their timing
+#     GET /venues/<venue>/upcoming       - the events at a venue starting from now, sorted by their timing
+#     GET /organisers/<username>/events  - the events of an organiser that haven't ended, sorted by their timing
+#     GET /search?q=<query>              - the events with a word starting with every word of the query
+# Lists of events take an optional limit parameter, the largest number of events listed, and every event is :
+#     {"name": <event name>, "venue": <location name>, "organiser": <username>, "timing": <DD/MM/YYYY hh:mm>,
+#      "start": <YYYY-MM-DDThh:mm>, "duration": <minutes, 0 if none>, "description": <text>}
+
+import argparse
+import asyncio
+import hashlib
+import json
+import sys
+from collections import OrderedDict
+from datetime import timedelta
+from functools import partial
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from event_store import EventStore, current_minutes, initial_datetime
+from storage import ReloadNeeded, open_storage
+
+default_host = "127.0.0.1"
+default_port = 8080
+
+# Seconds between checks for changes written by the kiosks
+poll_interval = 2
+
+# Maximum number of responses kept in the cache
+response_cache_size = 256
+
+status_texts = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}
+
+
+# An error answered with its status and a JSON message
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super(RequestError, self).__init__(message)
+        self.status = status
+        self.message = message
+
+
+def event_json(event_name, event_data):
+    return {"name": event_name,
+            "venue": event_data.venue,
+            "organiser": event_data.organiser,
+            "timing": event_data.timing,
+            "start": (initial_datetime + timedelta(minutes=event_data.start)).strftime("%Y-%m-%dT%H:%M"),
+            "duration": event_data.duration,
+            "description": "\n".join(event_data.description.split("\\n"))}
+
+
+class EventServer:
+    def __init__(self, storage):
+        self.storage = storage
+        self.event_store = EventStore(storage, maintain=False)  # The kiosks maintain the storage they write to
+
+        # Responses from the least to the most recently used, all computed at self.cache_generation
+        # Format of a response : (<minute it was computed at, or None if it doesn't depend on the time>, <ETag>,
+        #                         <body>)
+        self.response_cache = OrderedDict()  # {<request target>: <response>}
+        self.cache_generation = self.event_store.generation
+
+    # Returns the event names sorted by their timing
+    def sorted_by_timing(self, event_names):
+        return sorted(event_names, key=self.event_store.time_keys.__getitem__)
+
+    def events_json(self, events, limit):
+        return [event_json(event_name, events[event_name]) for event_name in list(events)[:limit]]
+
+    # Returns the payload of a request, and whether it depends on the current time
+    def payload(self, path, query):
+        limit = None
+        if "limit" in query:
+            try:
+                limit = int(query["limit"][0])
+            except ValueError:
+                raise RequestError(400, "limit must be a number")
+
+            if limit < 0:
+                raise RequestError(400, "limit must not be negative")
+
+        parts = [unquote(part) for part in path.strip("/").split("/")]
+        event_store = self.event_store
+
+        if parts == ["venues"]:
+            return [{"venue": venue, "events": len(event_store.venue_index[venue])}
+                    for venue in sorted(event_store.venue_index)], False
+
+        if parts == ["events"]:
+            return self.events_json(event_store.timeline_at(""), limit), False
+
+        if parts == ["upcoming"]:
+            return self.events_json(event_store.upcoming_at(""), limit), True
+
+        if len(parts) == 3 and parts[0] == "venues" and parts[2] == "events":
+            return self.events_json(event_store.timeline_at(parts[1]), limit), False
+
+        if len(parts) == 3 and parts[0] == "venues" and parts[2] == "upcoming":
+            return self.events_json(event_store.upcoming_at(parts[1]), limit), True
+
+        if len(parts) == 3 and parts[0] == "organisers" and parts[2] == "events":
+            events = event_store.events_by(parts[1])
+            return self.events_json({event_name: events[event_name]
+                                     for event_name in self.sorted_by_timing(events)}, limit), False
+
+        if parts == ["search"]:
+            matches = self.sorted_by_timing(event_store.search(query.get("q", [""])[0]))
+            return self.events_json({event_name: event_store.events[event_name] for event_name in matches},
+                                    limit), False
+
+        raise RequestError(404, "Unknown path : " + path)
+
+    # Returns the ETag and body of the response to a request target, from the cache while it is up to date
+    def response(self, target):
+        if self.event_store.generation != self.cache_generation:
+            self.response_cache.clear()
+            self.cache_generation = self.event_store.generation
+
+        minute = current_minutes()
+        cached = self.response_cache.get(target)
+
+        if cached is not None and cached[0] in (None, minute):
+            self.response_cache.move_to_end(target)
+            return cached[1:]
+
+        url = urlsplit(target)
+        payload, timed = self.payload(url.path, parse_qs(url.query))
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+
+        self.response_cache[target] = (minute if timed else None, etag, body)
+        if len(self.response_cache) > response_cache_size:
+            self.response_cache.popitem(last=False)
+
+        return etag, body
+
+    # Returns the status, headers and body answering a request
+    def answer(self, method, target, headers):
+        if method not in ("GET", "HEAD"):
+            return self.error(405, "Only GET and HEAD are supported")
+
+        try:
+            etag, body = self.response(target)
+        except RequestError as error:
+            return self.error(error.status, error.message)
+
+        response_headers = {"Content-Type": "application/json; charset=utf-8", "ETag": etag,
+                            "Cache-Control": "no-cache"}
+
+        if etag in [tag.strip() for tag in headers.get("if-none-match", "").split(",")]:
+            return 304, response_headers, b""
+
+        return 200, response_headers, b"" if method == "HEAD" else body
+
+    def error(self, status, message):
+        return status, {"Content-Type": "application/json; charset=utf-8"}, \
+            json.dumps({"error": message}).encode("utf-8")
+
+    # Answers the requests of a connection, which is kept open between requests unless the client closes it
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+
+                method, target, version = request_line.decode("latin-1").split()
+
+                headers = {}
+                while True:
+                    header_line = await reader.readline()
+                    if header_line in (b"\r\n", b"\n", b""):
+                        break
+
+                    header_name, _, header_value = header_line.decode("latin-1").partition(":")
+                    headers[header_name.strip().lower()] = header_value.strip()
+
+                status, response_headers, body = self.answer(method, target, headers)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+
+                response_headers["Content-Length"] = str(len(body))
+                response_headers["Connection"] = "keep-alive" if keep_alive else "close"
+
+                writer.write(("HTTP/1.1 " + str(status) + " " + status_texts[status] + "\r\n" +
+                              "".join(name + ": " + value + "\r\n" for name, value in response_headers.items()) +
+                              "\r\n").encode("latin-1") + body)
+                await writer.drain()
+
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError, asyncio.LimitOverrunError):
+            # Malformed requests and dropped connections just close the connection
+            pass
+        finally:
+            writer.close()
+
+    # Applies the changes written by the kiosks, and removes the events as they end
+    async def poll_changes(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            await asyncio.sleep(poll_interval)
+
+            # A failed check is reported and tried again on the next one, rather than leaving the events stale
+            try:
+                await self.check_changes(loop)
+            except Exception as error:
+                print("Could not check for changes : " + repr(error), file=sys.stderr)
+
+            # The kiosks write the removal of ended events, so the server only takes them off its indexes
+            self.event_store.expire()
+            self.event_store.expired.clear()
+
+    async def check_changes(self, loop):
+        try:
+            result = await loop.run_in_executor(None, self.storage.read_changes)
+        except ReloadNeeded:
+            # The server makes no changes of its own, so there are none to journal while the events are read again, and
+            # a failed reload leaves the events as they were
+            loaded = await loop.run_in_executor(None, partial(EventStore, self.storage, maintain=False))
+            self.event_store.adopt(loaded)
+            return
+
+        if result is not None:
+            changes, position = result
+            self.event_store.apply_changes(changes)
+            self.storage.changes_applied(position)
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        poller = asyncio.ensure_future(self.poll_changes())
+
+        print("Serving events on http://" + host + ":" + str(port), file=sys.stderr)
+
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            poller.cancel()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Read-only HTTP/JSON server for the events")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)  # Passed along by main.py
+    parser.add_argument("--host", default=default_host, help="address to listen on (default: localhost only)")
+    parser.add_argument("--port", type=int, default=default_port)
+    arguments = parser.parse_args(argv)
+
+    event_server = EventServer(open_storage())
+    event_server.event_store.expire()
+    event_server.event_store.expired.clear()
+
+    try:
+        asyncio.run(event_server.serve(arguments.host, arguments.port))
+    except KeyboardInterrupt:
+        pass
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+# Binary snapshots of the events log, memory-mapped so that the events can be loaded without parsing the log
+# The log stays the source of truth : a snapshot records how much of the log it covers, and the records appended after
+# that are replayed on top of it, while a log that was rewritten (by compaction) makes the snapshot unusable
+#
+# Format of a snapshot, little-endian :
+#     header  - <magic> <number of events> <number of strings> <size of the log covered> <check of the log covered>
+#               <dead records in the log covered> <offset of the heap>
+#     strings - one fixed-width entry per venue or organiser : <heap offset> <length>
+#     events  - one fixed-width entry per event, in the order they were added :
+#               <name heap offset> <name length> <venue string> <organiser string> <start minute> <duration>
+#               <description heap offset> <description length>
+#     heap    - the UTF-8 text of every name, description, venue and organiser, addressed by offset
+# Descriptions are only decoded from the heap when they are asked for
+
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+from event_store import EventRecord
+
+magic = b"EVSNAP01"
+header_format = struct.Struct("<8sIIQIIQ")
+string_format = struct.Struct("<QI")
+event_format = struct.Struct("<QIIIqiQI")
+
+# Number of bytes of the log, before the size covered, that a snapshot checks to know the log wasn't rewritten
+check_size = 4096
+
+
+# Returns a suffix for temporary files that no other process or thread sharing the log uses at the same time
+def temp_suffix():
+    return str(os.getpid()) + "-" + str(threading.get_ident())
+
+
+# Returns the check of the first `size` bytes of the log, a CRC of its last bytes
+def log_check(log_path, size):
+    with open(log_path, "rb") as log_file:
+        log_file.seek(max(0, size - check_size))
+        return zlib.crc32(log_file.read(min(size, check_size)))
+
+
+# Writes a snapshot of events, {<event name>: <EventRecord>}, covering the first log_size bytes of the log, whose
+# check (see log_check) is given, since the log may be replaced while the snapshot is written
+# The snapshot is written to a temporary file first, so that a snapshot is never left half written
+def write_snapshot(snapshot_path, events, log_size, check, dead_records):
+    heap = bytearray()
+    string_ids = {}  # {<venue or organiser>: <string number>}
+    string_entries = []
+    event_entries = []
+
+    def add_text(text):
+        encoded = text.encode("utf-8")
+        heap.extend(encoded)
+        return len(heap) - len(encoded), len(encoded)
+
+    def string_id(text):
+        if text not in string_ids:
+            string_ids[text] = len(string_entries)
+            string_entries.append(string_format.pack(*add_text(text)))
+
+        return string_ids[text]
+
+    for event_name in events:
+        record = events[event_name]
+        name_offset, name_length = add_text(event_name)
+        venue, organiser = string_id(record.venue), string_id(record.organiser)
+        description_offset, description_length = add_text(record.description)
+
+        event_entries.append(event_format.pack(name_offset, name_length, venue, organiser, record.start,
+                                               record.duration, description_offset, description_length))
+
+    heap_offset = header_format.size + string_format.size * len(string_entries) + event_format.size * len(events)
+    header = header_format.pack(magic, len(event_entries), len(string_entries), log_size, check, dead_records,
+                                heap_offset)
+
+    temp_path = snapshot_path + "." + temp_suffix() + ".tmp"
+
+    with open(temp_path, "wb") as snapshot_file:
+        snapshot_file.write(header)
+        snapshot_file.write(b"".join(string_entries))
+        snapshot_file.write(b"".join(event_entries))
+        snapshot_file.write(heap)
+
+    # A snapshot that is still mapped can't be replaced on some systems, and is then left for the next attempt
+    try:
+        os.replace(temp_path, snapshot_path)
+    except OSError:
+        os.remove(temp_path)
+
+
+# A snapshot mapped into memory, kept open for as long as records read from it are alive
+class EventSnapshot:
+    def __init__(self, snapshot_path):
+        with open(snapshot_path, "rb") as snapshot_file:
+            self.mapped = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (file_magic, self.event_count, self.string_count, self.log_size, self.log_check, self.dead_records,
+         self.heap_offset) = header_format.unpack_from(self.mapped, 0)
+
+        if file_magic != magic:
+            raise ValueError("Not an events snapshot : " + snapshot_path)
+
+        self.events_offset = header_format.size + string_format.size * self.string_count
+
+    # Returns whether the snapshot still matches the log, which may have had records appended since
+    def matches(self, log_path):
+        return os.path.getsize(log_path) >= self.log_size and log_check(log_path, self.log_size) == self.log_check
+
+    def text(self, offset, length):
+        start = self.heap_offset + offset
+        return str(self.mapped[start:start + length], "utf-8")
+
+    # Returns the description of the event with the given entry number
+    def description(self, entry):
+        description_offset, description_length = event_format.unpack_from(
+            self.mapped, self.events_offset + event_format.size * entry)[6:]
+
+        return self.text(description_offset, description_length)
+
+    # Returns a dictionary of all the events, as records whose descriptions stay in the snapshot
+    def read_events(self):
+        view = memoryview(self.mapped)
+        strings = [self.text(offset, length) for offset, length in
+                   string_format.iter_unpack(view[header_format.size:self.events_offset])]
+
+        entries = event_format.iter_unpack(
+            view[self.events_offset:self.events_offset + event_format.size * self.event_count])
+
+        return {self.text(name_offset, name_length): EventRecord(strings[venue], strings[organiser], start, entry,
+                                                                 duration, self)
+                for entry, (name_offset, name_length, venue, organiser, start, duration, _, _) in enumerate(entries)}
+
+
+# Returns the snapshot at snapshot_path and a dictionary of its events if it still matches the log, or None
+def load_snapshot(snapshot_path, log_path):
+    if not os.path.exists(snapshot_path):
+        return None
+
+    try:
+        snapshot = EventSnapshot(snapshot_path)
+
+        if not snapshot.matches(log_path):
+            return None
+
+        return snapshot, snapshot.read_events()
+    except (OSError, ValueError, IndexError, struct.error):
+        # A snapshot that can't be read is written again from the log
+        return None
@@ -0,0 +1,554 @@
+# Storage backends for the events and credentials databases
+# The events store and the login page only talk to the interface defined by Storage
+
+import os
+import sqlite3
+import threading
+
+from event_store import EventRecord, as_record
+from file_lock import FileLock
+from snapshot import load_snapshot, log_check, temp_suffix, write_snapshot
+
+# Format of an event entry : [<location name>, <organiser username>, <DD/MM/YYYY hh:mm>, <Description>, <Duration>]
+# The duration, in minutes, is optional (see event_store.py)
+# Events are read as EventRecords, and written from EventRecords or entries
+
+# The log is compacted once it holds at least this many dead records, and at least as many dead records as live ones
+compaction_threshold = 100
+
+# The snapshot of the log is written again once this many records have to be replayed on top of it
+snapshot_tail_records = 1000
+
+
+# Raised by read_changes when the events can't be brought up to date from the changes alone, and must be read again
+class ReloadNeeded(Exception):
+    pass
+
+
+# The interface shared by all the storage backends
+class Storage:
+    def __init__(self):
+        # Held around every write, so that writes never interleave with each other or with background maintenance
+        self.lock = threading.RLock()
+
+    # Returns a dictionary of all the events, in the order they were added
+    def read_events(self):
+        raise NotImplementedError
+
+    def write_event(self, event_name, event_data):
+        raise NotImplementedError
+
+    # Adds many events, {<event name>: <record or entry>}, with a single write where the backend allows it
+    def write_events(self, events_dict):
+        with self.lock:
+            for event_name in events_dict:
+                self.write_event(event_name, events_dict[event_name])
+
+    def delete_events(self, event_names):
+        raise NotImplementedError
+
+    # Called after events are removed, with the live events, for any housekeeping the backend needs
+    def maintain(self, events):
+        pass
+
+    # Returns the changes made to the events by other processes since they were last read or applied, or None if
+    # there are none
+    # Format of the changes : ([(<event name>, <EventRecord, or None for a removal>), ...], <position>), where the
+    # position is passed to changes_applied once the changes are applied to the events store
+    # Raises ReloadNeeded when the events must be read again instead
+    def read_changes(self):
+        return None
+
+    def changes_applied(self, position):
+        pass
+
+    # Returns a dictionary of all usernames and their hashed passwords
+    def read_credentials(self):
+        raise NotImplementedError
+
+    def write_credential(self, username, password_hash):
+        raise NotImplementedError
+
+    # Returns a value that changes whenever the credentials are changed, by this or any other process
+    def credentials_version(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+# A cache of the credentials database, re-read only when the storage reports that the credentials have changed
+class CredentialCache:
+    def __init__(self, storage):
+        self.storage = storage
+        self.credentials_dict = {}  # {<username>: <hashed password>}
+        self.version = None
+
+    def refresh(self):
+        version = self.storage.credentials_version()
+
+        if version != self.version:
+            self.credentials_dict = self.storage.read_credentials()
+            self.version = version
+
+    # Returns the hashed password of username, or None if the username doesn't exist
+    def get(self, username):
+        self.refresh()
+        return self.credentials_dict.get(username)
+
+    def __contains__(self, username):
+        return self.get(username) is not None
+
+    # Adds new credentials unless the username is taken, and returns whether they were added
+    def register(self, username, password_hash):
+        with self.storage.lock:
+            if username in self:
+                return False
+
+            self.add(username, password_hash)
+            return True
+
+    # Writes new credentials through to the storage
+    # The version is left as it was before the write, since another process may write credentials at the same time
+    # (the SQLite backend's lock only excludes this process's threads), so the next refresh reads them again if they
+    # changed meanwhile
+    # SQLite's data_version doesn't count the connection's own writes, while the credentials file is read once more
+    def add(self, username, password_hash):
+        with self.storage.lock:
+            self.refresh()
+            self.storage.write_credential(username, password_hash)
+            self.credentials_dict[username] = password_hash
+
+
+# Converts an event's name and data to a line of the events file
+def format_entry(event_name, event_data):
+    return event_name + "||" + "|".join(event_data) + "\n"
+
+
+# Converts an event's name to a tombstone line of the events file
+def format_tombstone(event_name):
+    return "||" + event_name + "\n"
+
+
+# Converts bytes read from the events file to its records, separated by line breaks
+def decode_records(data):
+    return data.decode("utf-8").replace("\r\n", "\n")
+
+
+# Converts a line of the events file to the event's name and record
+def parse_entry(entry):
+    event_name, other = entry.split("||")
+    return event_name, EventRecord.from_entry(other.split("|"))
+
+
+# The default backend, using the pipe-delimited events.txt and the colon-delimited credentials.txt
+# The events file is an append-only log, replayed in order when it is read
+# Format of an add record : <event name>||<location name>|<organiser username>|<DD/MM/YYYY hh:mm>|<Description>
+#                           followed by |<Duration> for events with a duration
+# Format of a tombstone record (removes an event) : ||<event name>
+# Event names can't contain a pipe, so a record starting with "||" is always a tombstone
+# The log is read from its binary snapshot (see snapshot.py) when it has one, and only the records appended after the
+# snapshot are parsed
+# Several processes can share the files : every write holds a lock on <events file>.lock (see file_lock.py), and the
+# records other processes append are picked up by read_changes
+class FileStorage(Storage):
+    def __init__(self, events_path="events.txt", credentials_path="credentials.txt", snapshot_path=None):
+        super(FileStorage, self).__init__()
+
+        self.events_path = events_path
+        self.credentials_path = credentials_path
+        self.snapshot_path = snapshot_path or events_path + ".snapshot"
+
+        # Excludes the other threads of this process, and the other processes sharing the files
+        self.lock = FileLock(events_path + ".lock")
+
+        # The identity of the log file, which changes when the log is compacted, and how much of it has been read
+        # Every record before log_offset has been applied to the events store, so the records after it are the ones
+        # appended by other processes, and this process's own records, which are skipped when the others are read
+        # This process's records may be older than its events store (an event removed since its add record was written
+        # would be added back), so they must never be applied to it
+        self.log_identity = None
+        self.log_offset = 0
+        self.own_appends = []  # [(<start>, <end>), ...], the byte ranges after log_offset appended by this process
+
+        # Number of records in the log that don't describe a live event (removed events and tombstones)
+        self.dead_records = 0
+        self.compacting = False
+
+        # Whether the snapshot is missing or far behind the log, and whether it is being written again
+        self.snapshot_stale = False
+        self.snapshotting = False
+
+    def read_events(self):
+        with self.lock:
+            loaded, events, snapshot_size, self.dead_records, appended = self.read_log()
+
+            self.log_identity = self.log_stat()[0]
+            self.log_offset = snapshot_size + len(appended)
+            self.own_appends = []
+
+        replayed, dead_records = self.replay(decode_records(appended), events)
+        self.dead_records += dead_records
+        self.snapshot_stale = not loaded or replayed >= snapshot_tail_records
+
+        return events
+
+    # Reads the first log_size bytes of the log (the whole log if log_size is None), from the snapshot for the part of
+    # them it covers, if it still matches the log
+    # Must be called with the lock held, so that no record is read half written
+    # Returns whether the snapshot was used, its events, the size of the log and the number of dead records it covers,
+    # and the bytes of the log after it, whose records must be replayed on top of its events
+    def read_log(self, log_size=None):
+        events = {}
+        snapshot_size = dead_records = 0
+
+        loaded = load_snapshot(self.snapshot_path, self.events_path)
+        if loaded is not None and (log_size is None or loaded[0].log_size <= log_size):
+            snapshot, events = loaded
+            snapshot_size, dead_records = snapshot.log_size, snapshot.dead_records
+        else:
+            loaded = None
+
+        with open(self.events_path, "rb") as events_file:
+            events_file.seek(snapshot_size)
+            appended = events_file.read() if log_size is None else events_file.read(log_size - snapshot_size)
+
+        return loaded is not None, events, snapshot_size, dead_records, appended
+
+    # Applies the records of the log in records, a string, to events
+    # Returns the number of records applied, and the number of dead records they leave in the log
+    def replay(self, records, events):
+        replayed = dead_records = 0
+
+        for entry in records.split("\n"):
+            if not entry:
+                continue
+
+            replayed += 1
+
+            if entry.startswith("||"):
+                event_name = entry[2:]
+                dead_records += 1
+
+                if event_name in events:
+                    del events[event_name]
+                    dead_records += 1
+            else:
+                event_name, event_data = parse_entry(entry)
+
+                # A repeated name replaces the older record
+                if event_name in events:
+                    del events[event_name]
+                    dead_records += 1
+
+                events[event_name] = event_data
+
+        return replayed, dead_records
+
+    # Returns the identity of the log file and its size
+    def log_stat(self):
+        log_stat = os.stat(self.events_path)
+        return (log_stat.st_dev, log_stat.st_ino), log_stat.st_size
+
+    def read_changes(self):
+        with self.lock:
+            log_identity, log_size = self.log_stat()
+
+            # The log was compacted by another process, so the offsets read so far don't apply to it anymore
+            if log_identity != self.log_identity or log_size < self.log_offset:
+                raise ReloadNeeded("The events file was rewritten")
+
+            if log_size == self.log_offset:
+                return None
+
+            with open(self.events_path, "rb") as events_file:
+                events_file.seek(self.log_offset)
+                appended = events_file.read(log_size - self.log_offset)
+
+            # Cutting this process's own records out, from the last one so that the earlier ranges stay in place
+            for start, end in reversed(self.own_appends):
+                appended = appended[:start - self.log_offset] + appended[end - self.log_offset:]
+
+        changes = []
+
+        for entry in decode_records(appended).split("\n"):
+            if not entry:
+                continue
+
+            if entry.startswith("||"):
+                changes.append((entry[2:], None))
+                self.dead_records += 2  # The add record and its tombstone
+            else:
+                changes.append(parse_entry(entry))
+
+        return changes, (log_identity, log_size)
+
+    def changes_applied(self, position):
+        log_identity, log_offset = position
+
+        with self.lock:
+            if log_identity == self.log_identity and log_offset > self.log_offset:
+                self.log_offset = log_offset
+                self.own_appends = [own_append for own_append in self.own_appends if own_append[0] >= log_offset]
+
+    def write_event(self, event_name, event_data):
+        with self.lock:
+            self.append_records(format_entry(event_name, event_data))
+
+    # Adds many events with a single append to the events file
+    def write_events(self, events_dict):
+        with self.lock:
+            self.append_records("".join(format_entry(event_name, events_dict[event_name])
+                                        for event_name in events_dict))
+
+    # Removes many events with a single append to the events file
+    def delete_events(self, event_names):
+        with self.lock:
+            self.append_records("".join(format_tombstone(event_name) for event_name in event_names))
+            self.dead_records += 2 * len(event_names)  # The add record and its tombstone
+
+    def append_records(self, records):
+        with self.lock:
+            log_identity, log_size = self.log_stat()
+
+            with open(self.events_path, "a") as events_file:
+                events_file.write(records)
+
+            if log_identity != self.log_identity:
+                return
+
+            # Without records from other processes before these, the log has been applied up to its new end, and else
+            # these are skipped when the records of the other processes are read
+            if log_size == self.log_offset:
+                self.log_offset = os.path.getsize(self.events_path)
+            else:
+                self.own_appends.append((log_size, os.path.getsize(self.events_path)))
+
+    # Starts compacting the log in the background once enough of it is dead, or else writing its snapshot again
+    # once it is stale
+    # Both are built from the log itself rather than from events, which are ahead of the log while writes are pending
+    def maintain(self, events):
+        if self.compacting or self.snapshotting:
+            return
+
+        if self.dead_records >= compaction_threshold and self.dead_records >= len(events):
+            self.compacting = True
+            threading.Thread(target=self.compact, daemon=True).start()
+        elif self.snapshot_stale:
+            self.snapshot_stale = False
+            self.snapshotting = True
+            threading.Thread(target=self.take_snapshot, daemon=True).start()
+
+    # Writes a snapshot of the whole log, from the current snapshot and the records appended after it
+    def take_snapshot(self):
+        try:
+            with self.lock:
+                loaded, events, snapshot_size, dead_records, appended = self.read_log()
+                log_size = snapshot_size + len(appended)
+                check = log_check(self.events_path, log_size)
+
+            replayed, appended_dead_records = self.replay(decode_records(appended), events)
+
+            if not loaded or replayed:
+                write_snapshot(self.snapshot_path, events, log_size, check, dead_records + appended_dead_records)
+        finally:
+            self.snapshotting = False
+
+    # Rewrites the log with only the live events
+    # The records before log_offset, which have all been applied to the events store, are replaced by the events they
+    # leave, and the records after it, appended by this process or others, are copied over before the log is replaced
+    def compact(self):
+        temp_path = self.events_path + "." + temp_suffix() + ".compact"
+
+        try:
+            with self.lock:
+                log_identity = self.log_identity
+                snapshot_size = self.log_offset
+                snapshot_dead_records = self.dead_records
+
+                # Nothing is known about a log compacted by another process until it is read again
+                if self.log_stat()[0] != log_identity:
+                    return
+
+                _, events, _, _, appended = self.read_log(snapshot_size)
+
+            self.replay(decode_records(appended), events)
+            snapshot = "".join(format_entry(event_name, events[event_name]) for event_name in events)
+
+            with open(temp_path, "w") as temp_file:
+                temp_file.write(snapshot)
+
+            compacted_size = os.path.getsize(temp_path)
+
+            with self.lock:
+                # Another process compacted the log first
+                if self.log_stat()[0] != log_identity:
+                    os.remove(temp_path)
+                    return
+
+                with open(self.events_path, "rb") as events_file:
+                    events_file.seek(snapshot_size)
+                    appended = events_file.read()
+
+                with open(temp_path, "ab") as temp_file:
+                    temp_file.write(appended)
+
+                os.replace(temp_path, self.events_path)
+                self.dead_records -= snapshot_dead_records
+
+                self.log_identity = self.log_stat()[0]
+                self.log_offset = compacted_size + self.log_offset - snapshot_size
+                self.own_appends = [(start + compacted_size - snapshot_size, end + compacted_size - snapshot_size)
+                                    for start, end in self.own_appends]
+                check = log_check(self.events_path, compacted_size)
+
+            # The compacted log starts with exactly the copied events, which are therefore its snapshot
+            write_snapshot(self.snapshot_path, events, compacted_size, check, 0)
+        finally:
+            self.compacting = False
+
+    def read_credentials(self):
+        credentials_dict = {}
+
+        with open(self.credentials_path, "r") as credentials_file:
+            for entry in credentials_file.readlines():
+                entry_split = entry.split(":")
+                credentials_dict[entry_split[0]] = entry_split[1].strip()
+
+        return credentials_dict
+
+    def write_credential(self, username, password_hash):
+        with self.lock:
+            with open(self.credentials_path, "a") as credentials_file:
+                credentials_file.write(username + ":" + password_hash + "\n")
+
+    def credentials_version(self):
+        credentials_stat = os.stat(self.credentials_path)
+        return credentials_stat.st_mtime_ns, credentials_stat.st_size
+
+    def close(self):
+        self.lock.close()
+
+
+# A backend using an SQLite database, for indexed queries, atomic writes and several organiser sessions at once
+class SqliteStorage(Storage):
+    def __init__(self, database_path="events.db"):
+        super(SqliteStorage, self).__init__()
+
+        self.database_path = database_path
+        self.events_version = None  # data_version when the events were last read
+
+        # The connection is shared with background threads, and every use of it is serialized by self.lock
+        # A busy timeout lets several application instances write to the same database
+        self.connection = sqlite3.connect(database_path, timeout=10, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+
+        with self.connection:
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS events (
+                    name TEXT PRIMARY KEY,
+                    venue TEXT NOT NULL,
+                    organiser TEXT NOT NULL,
+                    timing TEXT NOT NULL,
+                    start_minutes INTEGER NOT NULL,
+                    description TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS events_venue ON events (venue, start_minutes);
+                CREATE INDEX IF NOT EXISTS events_organiser ON events (organiser);
+                CREATE INDEX IF NOT EXISTS events_start ON events (start_minutes);
+
+                CREATE TABLE IF NOT EXISTS credentials (
+                    username TEXT PRIMARY KEY,
+                    password_hash TEXT NOT NULL
+                );
+            """)
+
+            # Databases created before events had durations
+            columns = [row[1] for row in self.connection.execute("PRAGMA table_info(events)")]
+            if "duration" not in columns:
+                self.connection.execute("ALTER TABLE events ADD COLUMN duration INTEGER")
+
+    def is_empty(self):
+        with self.lock:
+            return not any(self.connection.execute(
+                "SELECT 1 FROM events UNION ALL SELECT 1 FROM credentials LIMIT 1"))
+
+    def read_events(self):
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT name, venue, organiser, start_minutes, description, duration FROM events ORDER BY rowid").fetchall()
+            self.events_version = self.connection.execute("PRAGMA data_version").fetchone()[0]
+
+        # The start minute is read as stored, without parsing the timing again
+        return {row[0]: EventRecord(row[1], row[2], row[3], row[4], row[5] or 0) for row in rows}
+
+    # SQLite doesn't tell which rows other connections changed, so any change by them reloads all the events
+    # data_version also changes with the credentials, which only costs an unneeded reload
+    def read_changes(self):
+        with self.lock:
+            if self.connection.execute("PRAGMA data_version").fetchone()[0] != self.events_version:
+                raise ReloadNeeded("The events database was changed by another process")
+
+        return None
+
+    def write_event(self, event_name, event_data):
+        self.write_events({event_name: event_data})
+
+    # Adds many events in a single transaction
+    def write_events(self, events_dict):
+        records = ((event_name, as_record(events_dict[event_name])) for event_name in events_dict)
+
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((event_name, record.venue, record.organiser, record.timing, record.start, record.description,
+                  record.duration or None) for event_name, record in records))
+
+    def delete_events(self, event_names):
+        with self.lock, self.connection:
+            self.connection.executemany("DELETE FROM events WHERE name = ?",
+                                        ((event_name,) for event_name in event_names))
+
+    def read_credentials(self):
+        with self.lock:
+            return dict(self.connection.execute("SELECT username, password_hash FROM credentials"))
+
+    def write_credential(self, username, password_hash):
+        with self.lock, self.connection:
+            self.connection.execute("INSERT INTO credentials VALUES (?, ?)", (username, password_hash))
+
+    # data_version only changes on commits by other connections, and writes through this connection go through the
+    # credential cache, so it is enough to notice changes by other application instances
+    def credentials_version(self):
+        with self.lock:
+            return self.connection.execute("PRAGMA data_version").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+# Returns the storage backend selected by the EVENT_MAPPER_STORAGE environment variable ("file" or "sqlite")
+# A new SQLite database is filled with the contents of the text files, when they exist
+def open_storage():
+    backend = os.environ.get("EVENT_MAPPER_STORAGE", "file")
+    file_storage = FileStorage(os.environ.get("EVENT_MAPPER_EVENTS", "events.txt"),
+                               os.environ.get("EVENT_MAPPER_CREDENTIALS", "credentials.txt"))
+
+    if backend == "file":
+        return file_storage
+
+    if backend != "sqlite":
+        raise ValueError("Unknown storage backend : " + backend)
+
+    sqlite_storage = SqliteStorage(os.environ.get("EVENT_MAPPER_DATABASE", "events.db"))
+
+    if sqlite_storage.is_empty():
+        if os.path.exists(file_storage.events_path):
+            sqlite_storage.write_events(file_storage.read_events())
+
+        if os.path.exists(file_storage.credentials_path):
+            for username, password_hash in file_storage.read_credentials().items():
+                sqlite_storage.write_credential(username, password_hash)
+
+    return sqlite_storage